@@ -1,42 +1,217 @@
+import asyncio
+import atexit
 import os
+import threading
+import time
 import anthropic
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 import json
 
-class ClaudeHelper:
-    def __init__(self):
-        try:
-            print("Initializing ClaudeHelper...")
-            # Read API key from file
-            with open('api_key.txt', 'r') as f:
-                self.api_key = f.read().strip()
-            print(f"API key read: {self.api_key[:10]}...")
-            
-            # Validate API key
-            if not self.api_key:
+from response_cache import RESPONSE_CACHE_PATH, ResponseCache
+
+
+def _to_json(obj):
+    """Serialize objects such as NimMoves that know their own JSON form."""
+    if hasattr(obj, 'to_json'):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# The limits of the connection pool of the shared clients, whose open
+# connections are kept alive between requests. The class is httpx.Limits,
+# taken from anthropic to match the HTTP library it was built with.
+CONNECTION_LIMITS = type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+    max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+# How long a failed credential check is remembered before trying again
+CHECK_RETRY_SECONDS = 60
+
+# Process-wide registry of API keys, clients, credential checks and caches
+_registry_lock = threading.Lock()
+_api_keys = {}
+_clients = {}
+_async_clients = {}
+_client_loop = None
+_checks = {}
+_caches = {}
+
+
+def read_api_key(path='api_key.txt'):
+    """Read and validate the API key in path, once per process."""
+    with _registry_lock:
+        if path not in _api_keys:
+            with open(path, 'r') as f:
+                api_key = f.read().strip()
+            if not api_key:
                 raise ValueError("API key is empty")
-            if self.api_key == "your_api_key_here":
+            if api_key == "your_api_key_here":
                 raise ValueError("Please replace 'your_api_key_here' with your actual Claude API key")
-            if not self.api_key.startswith("sk-ant-api"):
+            if not api_key.startswith("sk-ant-api"):
                 raise ValueError("Invalid API key format")
-                
-            # Initialize client
-            print("Initializing Anthropic client...")
-            self.client = anthropic.Anthropic(api_key=self.api_key)
-            print("Anthropic client initialized successfully")
-            
-            # Test connection
-            print("Testing API connection...")
-            try:
-                response = self.client.messages.create(
-                    model="claude-3-opus-20240229",
-                    max_tokens=1,
-                    messages=[{"role": "user", "content": "test"}]
-                )
-                print("API connection test successful")
-            except Exception as e:
-                print(f"API connection test failed: {str(e)}")
-                raise Exception(f"Failed to connect to Claude API: {str(e)}")
+            _api_keys[path] = api_key
+        return _api_keys[path]
+
+
+def get_client(api_key, base_url=None):
+    """The Anthropic client for api_key and base_url, shared by the whole
+    process so that its pooled connections are reused."""
+    with _registry_lock:
+        key = (api_key, base_url)
+        if key not in _clients:
+            _clients[key] = anthropic.Anthropic(
+                api_key=api_key, base_url=base_url,
+                http_client=anthropic.DefaultHttpxClient(limits=CONNECTION_LIMITS))
+        return _clients[key]
+
+
+def get_client_loop():
+    """The event loop, running in a daemon thread, that the shared async
+    clients are used on. Async connections belong to the loop they were
+    opened in, so keeping the clients on one loop for the whole process
+    lets callers on any loop share their pooled connections."""
+    global _client_loop
+    with _registry_lock:
+        if _client_loop is None:
+            _client_loop = asyncio.new_event_loop()
+            threading.Thread(target=_client_loop.run_forever, name="claude-client-loop",
+                             daemon=True).start()
+        return _client_loop
+
+
+async def on_client_loop(coro):
+    """Await coro, a request on a shared async client, on the client loop,
+    from whatever event loop is running."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_client_loop()))
+
+
+def get_async_client(api_key, base_url=None):
+    """The AsyncAnthropic client for api_key and base_url shared by the
+    whole process. Its requests must be awaited through on_client_loop."""
+    with _registry_lock:
+        key = (api_key, base_url)
+        if key not in _async_clients:
+            _async_clients[key] = anthropic.AsyncAnthropic(
+                api_key=api_key, base_url=base_url,
+                http_client=anthropic.DefaultAsyncHttpxClient(limits=CONNECTION_LIMITS))
+        return _async_clients[key]
+
+
+@atexit.register
+def close_async_clients():
+    """Close the shared async clients and stop the client loop."""
+    global _client_loop
+    with _registry_lock:
+        loop, _client_loop = _client_loop, None
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    if loop is None:
+        return
+
+    async def close():
+        for client in clients:
+            await client.close()
+
+    try:
+        asyncio.run_coroutine_threadsafe(close(), loop).result(timeout=5)
+    except Exception as e:
+        print(f"Could not close Claude clients: {str(e)}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def check_credentials(api_key, base_url=None):
+    """Check that Claude accepts api_key by listing the models, which
+    costs no tokens. The outcome is remembered for the process, a failure
+    only for CHECK_RETRY_SECONDS. Raises an exception if the check fails."""
+    key = (api_key, base_url)
+    with _registry_lock:
+        outcome = _checks.get(key)
+    if outcome is None or (outcome is not True
+                           and time.monotonic() - outcome[1] > CHECK_RETRY_SECONDS):
+        print("Testing API connection...")
+        try:
+            get_client(api_key, base_url).models.list(limit=1)
+            print("API connection test successful")
+            outcome = True
+        except Exception as e:
+            print(f"API connection test failed: {str(e)}")
+            outcome = (str(e), time.monotonic())
+        with _registry_lock:
+            _checks[key] = outcome
+    if outcome is not True:
+        raise Exception(f"Failed to connect to Claude API: {outcome[0]}")
+
+
+def get_response_cache(path):
+    """The ResponseCache for path shared by the whole process."""
+    with _registry_lock:
+        if path not in _caches:
+            _caches[path] = ResponseCache(path)
+        return _caches[path]
+
+
+def _parse_suggestion_stream(chunks):
+    """Parse a suggestion as its text arrives in chunks: yield ("move",
+    move) as soon as the Move: line is complete, then ("explanation",
+    text) for every piece of the text after Explanation:."""
+    buffer = ''
+    move = None
+    explaining = started = False
+    for chunk in chunks:
+        if explaining:
+            if not started:
+                chunk = chunk.lstrip(' ')
+                started = bool(chunk)
+            if chunk:
+                yield ("explanation", chunk)
+            continue
+        buffer += chunk
+        while True:
+            end = buffer.find('\n')
+            line = buffer if end < 0 else buffer[:end]
+            if move is not None and line.startswith('Explanation:'):
+                explaining = True
+                text = buffer[len('Explanation:'):].lstrip(' ')
+                started = bool(text)
+                if text:
+                    yield ("explanation", text)
+                break
+            if end < 0:
+                break
+            if move is None and line.startswith('Move:'):
+                move = line[len('Move:'):].strip()
+                yield ("move", move)
+            buffer = buffer[end + 1:]
+    if move is None and buffer.startswith('Move:'):
+        yield ("move", buffer[len('Move:'):].strip())
+
+
+class ClaudeHelper:
+    model = "claude-3-opus-20240229"
+    # Bump when a prompt changes, so that answers cached for the old one are not used
+    prompt_version = 2
+    # None for the API's own address
+    base_url = None
+
+    def __init__(self, cache_path=RESPONSE_CACHE_PATH, api_key=None, base_url=None):
+        """Set up a helper without contacting the API: the key, the client
+        and the response cache are shared with every other helper in the
+        process. Call check() to find out whether Claude can be reached.
+        The key is read from api_key.txt unless given; base_url points the
+        helper at another server speaking the same API, such as
+        mock_claude_server.py."""
+        self.cache = None
+        if base_url is not None:
+            self.base_url = base_url
+        try:
+            print("Initializing ClaudeHelper...")
+            self.api_key = api_key if api_key is not None else read_api_key()
+            self.client = get_client(self.api_key, self.base_url)
+
+            # Open the response cache; Claude still works without it
+            if cache_path is not None:
+                try:
+                    self.cache = get_response_cache(cache_path)
+                except Exception as e:
+                    print(f"Claude response cache unavailable: {str(e)}")
                 
         except FileNotFoundError:
             print("api_key.txt not found")
@@ -44,25 +219,45 @@ class ClaudeHelper:
         except Exception as e:
             print(f"Error in ClaudeHelper initialization: {str(e)}")
             raise Exception(f"Error initializing Claude API: {str(e)}")
+
+    def check(self):
+        """Raise an exception unless Claude accepts this helper's API key,
+        asking the API only once per process (see check_credentials)."""
+        check_credentials(self.api_key, self.base_url)
     
-    def get_suggestions(self, game_state: dict) -> Tuple[str, str]:
-        """
-        Get a single move suggestion from Claude API
-        Args:
-            game_state: Current state of the game
-        Returns:
-            Tuple of (move_description, explanation)
-        """
-        if not isinstance(game_state, dict):
-            raise ValueError("game_state must be a dictionary")
-            
+    def _cache_key(self, kind, game_state, *moves):
+        """The cache key for a question about game_state. The legal moves
+        follow from the board, so only the rest of the state counts.
+        Answers from a server other than the API's are kept apart."""
+        state = {k: v for k, v in game_state.items() if k != "moves" or "board" not in game_state}
+        server = (self.base_url,) if self.base_url is not None else ()
+        return ResponseCache.key(self.model, self.prompt_version, kind, state, moves, *server,
+                                 default=_to_json)
+
+    def _cached(self, key):
+        if self.cache is None:
+            return None
         try:
-            print("Preparing prompt for Claude API...")
-            prompt = f"""
+            return self.cache.get(key)
+        except Exception as e:
+            print(f"Could not read Claude response cache: {str(e)}")
+            return None
+
+    def _store(self, key, value):
+        if self.cache is not None:
+            try:
+                self.cache.put(key, value)
+            except Exception as e:
+                print(f"Could not write Claude response cache: {str(e)}")
+
+    def _suggestion_prompt(self, game_state: dict) -> str:
+        return f"""
             You are an expert game player playing the Game of Nim. Given the following game state:
-            {json.dumps(game_state, indent=2)}
+            {json.dumps(game_state, indent=2, default=_to_json)}
             
-            Please suggest one possible move. The move must be in the format of a tuple (row, number_of_objects).
+            The rules: {game_state.get("rules", "A move takes any number of objects from one row.")}
+            
+            Please suggest one possible move. The move must be in the format of a tuple (row, number_of_objects), unless the rules give another format.
             For example, if you want to take 2 objects from row 1, the move should be (1, 2).
             
             For the move:
@@ -77,38 +272,169 @@ class ClaudeHelper:
             Remember:
             - The move must be a valid tuple
             - The row must be a valid index in the board
-            - The number_of_objects must be between 1 and the number of objects in that row
+            - The move must follow the rules and be one of the moves in the game state
             """
+
+    def _parse_suggestion(self, text: str) -> Tuple[str, str]:
+        """Extract the move and the explanation from Claude's response,
+        as stream_suggestions does: the explanation is all of the text
+        after Explanation:"""
+        move = None
+        explanation = []
+        
+        for kind, text in _parse_suggestion_stream([text]):
+            if kind == "move":
+                move = text
+            else:
+                explanation.append(text)
+        explanation = ''.join(explanation).strip()
+        
+        if move and explanation:
+            print(f"Successfully parsed response: Move={move}, Explanation={explanation}")
+            return (move, explanation)
+        else:
+            print("Failed to parse Claude's response")
+            raise Exception("Could not parse Claude's response")
+
+    def _comparison_prompt(self, game_state: dict, move1: str, move2: str) -> str:
+        return f"""
+            You are an expert game analyst. Given the following game state:
+            {json.dumps(game_state, indent=2, default=_to_json)}
+            
+            Compare these two moves:
+            Move 1: {move1}
+            Move 2: {move2}
+            
+            Analyze:
+            1. The immediate impact of each move
+            2. The strategic implications
+            3. Which move you would recommend and why
+            
+            Provide a detailed comparison.
+            """
+
+    @property
+    def async_client(self):
+        """The shared AsyncAnthropic client; await its requests through
+        on_client_loop."""
+        return get_async_client(self.api_key, self.base_url)
+
+    def get_suggestions(self, game_state: dict) -> Tuple[str, str]:
+        """
+        Get a single move suggestion from Claude API
+        Args:
+            game_state: Current state of the game
+        Returns:
+            Tuple of (move_description, explanation)
+        """
+        if not isinstance(game_state, dict):
+            raise ValueError("game_state must be a dictionary")
+            
+        key = self._cache_key("suggestion", game_state)
+        cached = self._cached(key)
+        if cached is not None:
+            return tuple(cached)
+
+        try:
+            print("Preparing prompt for Claude API...")
+            prompt = self._suggestion_prompt(game_state)
             
             print("Sending request to Claude API...")
             response = self.client.messages.create(
-                model="claude-3-opus-20240229",
+                model=self.model,
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
             )
             print("Received response from Claude API")
             
-            # Parse the response to extract move and explanation
-            move = None
-            explanation = None
+            suggestion = self._parse_suggestion(response.content[0].text)
+            self._store(key, list(suggestion))
+            return suggestion
+                
+        except Exception as e:
+            print(f"Error in get_suggestions: {str(e)}")
+            raise Exception(f"Error getting suggestions from Claude API: {str(e)}")
+
+    async def get_suggestions_async(self, game_state: dict) -> Tuple[str, str]:
+        """
+        Get a single move suggestion from Claude API without blocking the
+        event loop, so that other work can run while Claude answers
+        Args:
+            game_state: Current state of the game
+        Returns:
+            Tuple of (move_description, explanation)
+        """
+        if not isinstance(game_state, dict):
+            raise ValueError("game_state must be a dictionary")
             
-            for line in response.content[0].text.split('\n'):
-                if line.startswith('Move:'):
-                    move = line.split(': ')[1].strip()
-                elif line.startswith('Explanation:'):
-                    explanation = line.split(': ')[1].strip()
+        key = self._cache_key("suggestion", game_state)
+        cached = self._cached(key)
+        if cached is not None:
+            return tuple(cached)
+
+        try:
+            prompt = self._suggestion_prompt(game_state)
             
-            if move and explanation:
-                print(f"Successfully parsed response: Move={move}, Explanation={explanation}")
-                return (move, explanation)
-            else:
-                print("Failed to parse Claude's response")
-                raise Exception("Could not parse Claude's response")
+            print("Sending request to Claude API...")
+            response = await on_client_loop(self.async_client.messages.create(
+                model=self.model,
+                max_tokens=1000,
+                messages=[{"role": "user", "content": prompt}]
+            ))
+            print("Received response from Claude API")
+            
+            suggestion = self._parse_suggestion(response.content[0].text)
+            self._store(key, list(suggestion))
+            return suggestion
                 
         except Exception as e:
-            print(f"Error in get_suggestions: {str(e)}")
+            print(f"Error in get_suggestions_async: {str(e)}")
             raise Exception(f"Error getting suggestions from Claude API: {str(e)}")
     
+    def stream_suggestions(self, game_state: dict) -> Iterator[Tuple[str, str]]:
+        """
+        Get a single move suggestion from Claude API as it is written
+        Args:
+            game_state: Current state of the game
+        Yields:
+            ("move", move_description) as soon as the move has arrived, then
+            ("explanation", text) for each piece of the explanation
+        """
+        if not isinstance(game_state, dict):
+            raise ValueError("game_state must be a dictionary")
+            
+        key = self._cache_key("suggestion", game_state)
+        cached = self._cached(key)
+        if cached is not None:
+            yield ("move", cached[0])
+            yield ("explanation", cached[1])
+            return
+
+        move = None
+        explanation = []
+        try:
+            print("Streaming request to Claude API...")
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=1000,
+                messages=[{"role": "user", "content": self._suggestion_prompt(game_state)}]
+            ) as stream:
+                for kind, text in _parse_suggestion_stream(stream.text_stream):
+                    if kind == "move":
+                        move = text
+                    else:
+                        explanation.append(text)
+                    yield (kind, text)
+        except Exception as e:
+            print(f"Error in stream_suggestions: {str(e)}")
+            raise Exception(f"Error getting suggestions from Claude API: {str(e)}")
+
+        explanation = ''.join(explanation).strip()
+        if not (move and explanation):
+            print("Failed to parse Claude's response")
+            raise Exception("Could not parse Claude's response")
+        self._store(key, [move, explanation])
+
     def compare_moves(self, game_state: dict, move1: str, move2: str) -> str:
         """
         Compare two moves and provide analysis
@@ -123,30 +449,89 @@ class ClaudeHelper:
             raise ValueError("game_state must be a dictionary")
         if not isinstance(move1, str) or not isinstance(move2, str):
             raise ValueError("moves must be strings")
+
+        key = self._cache_key("comparison", game_state, move1, move2)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
             
         try:
-            prompt = f"""
-            You are an expert game analyst. Given the following game state:
-            {json.dumps(game_state, indent=2)}
-            
-            Compare these two moves:
-            Move 1: {move1}
-            Move 2: {move2}
-            
-            Analyze:
-            1. The immediate impact of each move
-            2. The strategic implications
-            3. Which move you would recommend and why
-            
-            Provide a detailed comparison.
-            """
-            
             response = self.client.messages.create(
-                model="claude-3-opus-20240229",
+                model=self.model,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": self._comparison_prompt(game_state, move1, move2)}]
             )
             
-            return response.content[0].text
+            comparison = response.content[0].text
+            self._store(key, comparison)
+            return comparison
+        except Exception as e:
+            raise Exception(f"Error comparing moves with Claude API: {str(e)}")
+
+    async def compare_moves_async(self, game_state: dict, move1: str, move2: str) -> str:
+        """
+        Compare two moves and provide analysis, without blocking the event loop
+        Args:
+            game_state: Current state of the game
+            move1: First move to compare
+            move2: Second move to compare
+        Returns:
+            Detailed comparison analysis
+        """
+        if not isinstance(game_state, dict):
+            raise ValueError("game_state must be a dictionary")
+        if not isinstance(move1, str) or not isinstance(move2, str):
+            raise ValueError("moves must be strings")
+
+        key = self._cache_key("comparison", game_state, move1, move2)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+            
+        try:
+            response = await on_client_loop(self.async_client.messages.create(
+                model=self.model,
+                max_tokens=1000,
+                messages=[{"role": "user", "content": self._comparison_prompt(game_state, move1, move2)}]
+            ))
+            
+            comparison = response.content[0].text
+            self._store(key, comparison)
+            return comparison
+        except Exception as e:
+            raise Exception(f"Error comparing moves with Claude API: {str(e)}")
+
+    def stream_comparison(self, game_state: dict, move1: str, move2: str) -> Iterator[str]:
+        """
+        Compare two moves and provide analysis as it is written
+        Args:
+            game_state: Current state of the game
+            move1: First move to compare
+            move2: Second move to compare
+        Yields:
+            The pieces of the comparison as they arrive
+        """
+        if not isinstance(game_state, dict):
+            raise ValueError("game_state must be a dictionary")
+        if not isinstance(move1, str) or not isinstance(move2, str):
+            raise ValueError("moves must be strings")
+
+        key = self._cache_key("comparison", game_state, move1, move2)
+        cached = self._cached(key)
+        if cached is not None:
+            yield cached
+            return
+
+        comparison = []
+        try:
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=1000,
+                messages=[{"role": "user", "content": self._comparison_prompt(game_state, move1, move2)}]
+            ) as stream:
+                for text in stream.text_stream:
+                    comparison.append(text)
+                    yield text
         except Exception as e:
-            raise Exception(f"Error comparing moves with Claude API: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error comparing moves with Claude API: {str(e)}")
+        self._store(key, ''.join(comparison))
@@ -1,27 +1,177 @@
+import asyncio
+import time
+from bisect import bisect_right
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+
 from games import *
 from claude_helper import ClaudeHelper
+from nim_solver import best_move, canonical, canonical_key, from_canonical, nim_sum, to_canonical
+
+# Threads that ask Claude on the shared client while the caller searches
+_claude_requests = ThreadPoolExecutor(max_workers=4, thread_name_prefix='claude')
+
+
+class NimMoves(Sequence):
+    """The legal moves on a Nim board: (row, n) for every row and every n
+    from 1 to the number of objects in the row. They are kept as one
+    range per row rather than listed, so a pile of millions of objects
+    costs nothing until the moves are iterated over. Membership tests
+    take constant time; len() and indexing work without the list too."""
+
+    __slots__ = ('board', '_ends')
+
+    def __init__(self, board):
+        self.board = board
+        self._ends = None
+
+    def __contains__(self, move):
+        try:
+            x, y = move
+        except (TypeError, ValueError):
+            return False
+        return (isinstance(x, int) and isinstance(y, int)
+                and 0 <= x < len(self.board) and 1 <= y <= self.board[x])
+
+    def __iter__(self):
+        for x, pile in enumerate(self.board):
+            for y in range(1, pile + 1):
+                yield x, y
+
+    def __len__(self):
+        return sum(self.board)
+
+    def __bool__(self):
+        return any(self.board)
+
+    def __getitem__(self, i):
+        if self._ends is None:
+            self._ends = list(accumulate(self.board))
+        n = self._ends[-1] if self._ends else 0
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('move index out of range')
+        x = bisect_right(self._ends, i)
+        return x, i - (self._ends[x - 1] if x else 0) + 1
+
+    def ranges(self):
+        """The moves as (row, range of numbers of objects) pairs."""
+        return [(x, range(1, pile + 1)) for x, pile in enumerate(self.board) if pile]
+
+    def to_json(self):
+        """The moves in a compact form for JSON: the least and greatest
+        number of objects that may be taken from each non-empty row."""
+        return [{"row": x, "min": 1, "max": pile} for x, pile in enumerate(self.board) if pile]
+
+    def __str__(self):
+        return ', '.join(f"({x}, 1..{pile})" for x, pile in enumerate(self.board) if pile)
+
+    def __repr__(self):
+        return f"NimMoves({tuple(self.board)!r})"
+
+
+class NimState(namedtuple('NimState', 'to_move, utility, board, total')):
+    """An immutable Nim position: the player to move, a cached utility, the
+    board as a tuple with the number of objects in each row, and the total
+    number of objects left. The legal moves are only listed on request."""
+
+    __slots__ = ()
+
+    @property
+    def moves(self):
+        """The legal moves, as a NimMoves of (row, number of objects) pairs."""
+        return NimMoves(self.board)
+
+
+class SuggestionCache(LRUCache):
+    """A bounded cache of the suggestions made during a session, so that
+    asking again about the same position costs nothing. When more than
+    maxsize are stored, the least recently used one is evicted."""
+
+    def __init__(self, maxsize=1024):
+        super().__init__(maxsize)
+
 
 class GameOfNim(Game):
     """Play Game of Nim with first player 'MAX'.
-    A state has the player to move, a cached utility, a list of moves in
-    the form of a list of (x, y) positions, and a board, in the form of
-    a list with number of objects in each row."""
+    A state is a NimState: the player to move, a cached utility, a board
+    in the form of a tuple with number of objects in each row, and the
+    number of objects left; moves are (x, y) pairs taking y objects from
+    row x. With misere=True, the player who takes the last object loses
+    instead of winning.
+
+    Claude is only connected to when first needed, so creating a game
+    costs no network round trips. An already connected ClaudeHelper can
+    be shared between games by passing it as claude; health_check=True
+    starts connecting in the background right away.
+
+    Set book to an opening_book.OpeningBook solved for the same rules to
+    answer from it before solving or searching.
+
+    Suggestions are kept in a SuggestionCache, self.suggestions, until the
+    next play_game: the evaluation function's by the canonical piles and
+    the player to move, so they serve every equivalent board too, and
+    Claude's, whose explanations name rows, by the board itself."""
 
-    def __init__(self, board=[3,1], use_claude=True):
+    name = 'nim'
+    book = None
+    # How a move is typed in, for the user and for Claude
+    move_format = "(row, number_of_objects)"
+
+    def __init__(self, board=[3,1], use_claude=True, misere=False, claude=None,
+                 health_check=False):
         self.board = board
-        moves = [(x, y) for x in range(len(board)) 
-                 for y in range(1,board[x]+1)]
-        self.initial = GameState(to_move='COMP', utility=0, board=board, moves=moves)
-        self.claude = None
-        if use_claude:
-            try:
-                self.claude = ClaudeHelper()
-                # Test Claude API connection
-                test_state = {"board": board, "to_move": "COMP", "moves": moves}
-                self.claude.get_suggestions(test_state)
-            except Exception as e:
-                print(f"Claude API initialization failed: {str(e)}")
-                self.claude = None
+        self.misere = misere
+        self.initial = NimState(to_move='COMP', utility=0, board=tuple(board), total=sum(board))
+        self.transposition_table = TranspositionTable()
+        self.suggestions = SuggestionCache()
+        self.use_claude = use_claude or claude is not None
+        self._claude = claude
+        self._claude_checked = claude is not None or not use_claude
+        self._claude_lock = threading.Lock()
+        if health_check:
+            self.check_claude()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(_claude=None, _claude_checked=not self.use_claude, _claude_lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._claude_lock = threading.Lock()
+
+    @property
+    def claude(self):
+        """The ClaudeHelper, connecting on first use; None if Claude is not
+        used or could not be reached."""
+        if not self._claude_checked:
+            with self._claude_lock:
+                if not self._claude_checked:
+                    try:
+                        self._claude = ClaudeHelper()
+                        self._claude.check()
+                    except Exception as e:
+                        print(f"Claude API initialization failed: {str(e)}")
+                        self._claude = None
+                    self._claude_checked = True
+        return self._claude
+
+    @property
+    def claude_available(self):
+        """True or False once Claude has been connected to (or failed to),
+        None while that is still to happen. Never waits on the network."""
+        if not self._claude_checked:
+            return None
+        return self._claude is not None
+
+    def check_claude(self):
+        """Connect to Claude in a background thread, unless that has been
+        done already; claude_available tells when it is done."""
+        if not self._claude_checked:
+            threading.Thread(target=lambda: self.claude, daemon=True).start()
 
     def get_claude_suggestion(self, state):
         """Get a single move suggestion from Claude API"""
@@ -29,24 +179,189 @@ class GameOfNim(Game):
             return ("(0, 1)", "Claude API is not available")
             
         try:
-            game_state = {
-                "board": state.board,
-                "to_move": state.to_move,
-                "moves": state.moves
-            }
-            return self.claude.get_suggestions(game_state)
+            key = ('claude', state.board, state.to_move)
+            suggestion = self.suggestions.get(key)
+            if suggestion is None:
+                game_state = self.claude_state(state)
+                suggestion = self.claude.get_suggestions(game_state)
+                self.suggestions.put(key, suggestion)
+            return suggestion
+        except Exception as e:
+            print(f"Error getting Claude suggestion: {str(e)}")
+            return ("(0, 1)", f"Claude API error: {str(e)}")
+
+    async def get_claude_suggestion_async(self, state):
+        """Get a single move suggestion from Claude API without blocking
+        the event loop, connecting to Claude in a thread if need be."""
+        claude = self._claude if self._claude_checked else (
+            await asyncio.get_running_loop().run_in_executor(None, lambda: self.claude))
+        if claude is None:
+            return ("(0, 1)", "Claude API is not available")
+
+        try:
+            key = ('claude', state.board, state.to_move)
+            suggestion = self.suggestions.get(key)
+            if suggestion is None:
+                game_state = self.claude_state(state)
+                suggestion = await claude.get_suggestions_async(game_state)
+                self.suggestions.put(key, suggestion)
+            return suggestion
         except Exception as e:
             print(f"Error getting Claude suggestion: {str(e)}")
             return ("(0, 1)", f"Claude API error: {str(e)}")
 
-    def get_eval_suggestion(self, state):
-        """Get a move suggestion from evaluation function using alpha-beta pruning"""
-        move = alpha_beta_search(state, self)
-        heuristic = get_heuristic(state, move)
-        board = state.board.copy()
-        board[move[0]] -= move[1]
+    async def get_suggestions_async(self, state, stats=None):
+        """Return (Claude's suggestion, the evaluation function's
+        suggestion) for state, searching in a thread while Claude answers,
+        so that it takes as long as the slower of the two."""
+        loop = asyncio.get_running_loop()
+        return tuple(await asyncio.gather(
+            self.get_claude_suggestion_async(state),
+            loop.run_in_executor(None, self.get_eval_suggestion, state, stats)))
+
+    def get_suggestions(self, state, stats=None):
+        """Return (Claude's suggestion, the evaluation function's
+        suggestion) for state, asking Claude on the shared client in a
+        thread while searching, so that it takes as long as the slower of
+        the two. Unlike get_suggestions_async, it needs no event loop."""
+        claude_suggestion = _claude_requests.submit(self.get_claude_suggestion, state)
+        eval_suggestion = self.get_eval_suggestion(state, stats)
+        return claude_suggestion.result(), eval_suggestion
+
+    @property
+    def rules(self):
+        """The name of the rules played, which an opening book must match."""
+        return (self.name or type(self).__name__) + ('-misere' if self.misere else '')
+
+    def book_move(self, state):
+        if self.book is None or self.book.rules != self.rules:
+            return None
+        piles, rows = canonical(state.board)
+        move = self.book.lookup(piles)
+        if move is None or move[0] >= len(piles) or not 0 < move[1] <= piles[move[0]]:
+            return None
+        return from_canonical(move, rows)
+
+    def solve(self, state):
+        """Return the best move at state from the nim sum, or None for a
+        variant of the game the closed form does not cover."""
+        return best_move(state.board, self.misere)
+
+    def get_eval_suggestion(self, state, stats=None):
+        """Get a move suggestion from the nim sum, falling back to alpha-beta
+        pruning for variants it cannot solve. Pass a SearchStats as stats to
+        collect the counts of the search. An opening book, if the game has
+        one, is asked first. Moves already suggested for the position are
+        not looked for again."""
+        if self.terminal_test(state):
+            return ("None", "No move can be made: the game is over.")
+        start = time.perf_counter()
+        piles, rows = canonical(state.board)
+        key = ('eval', piles, state.to_move)
+        move = self.suggestions.get(key)
+        if move is not None:
+            move = self.from_canonical(move, rows)
+            if stats is not None:
+                # As for the book and the solver, the lookup counts as the search
+                stats.searches += 1
+                stats.elapsed += time.perf_counter() - start
+        else:
+            move = self.book_move(state)
+            if move is None:
+                move = self.solve(state)
+            if move is None:
+                # The search counts itself in stats
+                move = alpha_beta_search(state, self, tt=self.transposition_table,
+                                         ordering=MoveOrdering(), stats=stats)
+            elif stats is not None:
+                # Answered without searching: the lookup counts as the search
+                stats.searches += 1
+                stats.elapsed += time.perf_counter() - start
+            self.suggestions.put(key, self.to_canonical(move, rows))
+        board = list(self.result(state, move).board)
+        heuristic = self.nim_value(board)
+        if heuristic is None:
+            return (str(move), f"{self.describe_move(move)} will reslt in a board state of {board}.")
+
+        return (str(move), f"{self.describe_move(move)} will reslt in a nim sum of {heuristic} and a board state of {board}.")
+
+    def stream_claude_suggestion(self, state):
+        """Yield Claude's suggestion at state as it arrives: ("move", move)
+        and then ("explanation", text) pieces, as ClaudeHelper.stream_suggestions.
+        Raises an exception if Claude is not available or fails."""
+        if self.claude is None:
+            raise Exception("Claude API is not available")
+        key = ('claude', state.board, state.to_move)
+        suggestion = self.suggestions.get(key)
+        if suggestion is not None:
+            yield ("move", suggestion[0])
+            yield ("explanation", suggestion[1])
+            return
+        game_state = self.claude_state(state)
+        move, explanation = None, []
+        for kind, text in self.claude.stream_suggestions(game_state):
+            if kind == "move":
+                move = text
+            else:
+                explanation.append(text)
+            yield (kind, text)
+        self.suggestions.put(key, (move, ''.join(explanation).strip()))
+
+    def stream_comparison(self, state, claude_move, eval_move):
+        """Yield the pieces of Claude's comparison of two moves at state as
+        they arrive, remembering the whole answer."""
+        if self.claude is None:
+            raise Exception("Claude API is not available")
+        key = ('compare', state.board, state.to_move, claude_move, eval_move)
+        comparison = self.suggestions.get(key)
+        if comparison is not None:
+            yield comparison
+            return
+        game_state = self.claude_state(state)
+        pieces = []
+        for text in self.claude.stream_comparison(game_state, claude_move, eval_move):
+            pieces.append(text)
+            yield text
+        self.suggestions.put(key, ''.join(pieces))
+
+    def to_canonical(self, move, rows):
+        """Translate a move to the canonical piles, as nim_solver.to_canonical."""
+        return to_canonical(move, rows)
+
+    def from_canonical(self, move, rows):
+        return from_canonical(move, rows)
 
-        return (str(move), f"Taking {move[1]} objects from row {move[0]} will reslt in a nim sum of {heuristic} and a board state of {board}.")
+    def play_game(self, *players):
+        self.suggestions.clear()
+        return super().play_game(*players)
+
+    def nim_value(self, board):
+        """The nim sum of board: 0 exactly when the player to move loses
+        (in normal play). Variants score each pile by its Grundy value, and
+        return None for a board they have no values for."""
+        return nim_sum(board)
+
+    def describe_move(self, move):
+        return f"Taking {move[1]} objects from row {move[0]}"
+
+    def describe_rules(self):
+        """The rules in a sentence or two, for the user and for Claude."""
+        last = "loses" if self.misere else "wins"
+        return ("A move takes any number of objects from one row. "
+                f"The player who takes the last object {last}.")
+
+    def listed_moves(self, state):
+        """The legal moves at state as shown to the user and to Claude."""
+        return state.moves
+
+    def claude_state(self, state):
+        """The game state Claude is asked about, with the rules played."""
+        return {
+            "board": list(state.board),
+            "to_move": state.to_move,
+            "rules": self.describe_rules(),
+            "moves": self.listed_moves(state)
+        }
 
     def display_suggestions(self, claude_suggestion, eval_suggestion):
         """Display both Claude's and evaluation function's suggestions"""
@@ -67,62 +382,59 @@ class GameOfNim(Game):
         while True:
             choice = input("\nChoose an option (1, 2, or 3): ").strip()
             
-            if choice == '1':
-                return eval(claude_suggestion[0])
-            elif choice == '2':
-                return eval(eval_suggestion[0])
+            if choice in ('1', '2'):
+                suggestion = claude_suggestion if choice == '1' else eval_suggestion
+                try:
+                    move = eval(suggestion[0])
+                except Exception:
+                    move = None
+                if self.is_legal(state, move):
+                    return move
+                print(f"{suggestion[0]} is not a legal move. Please choose another option.")
+                continue
             elif choice == '3':
                 return self.get_custom_move(state)
             print("Invalid choice. Please enter 1, 2, or 3.")
 
     def get_custom_move(self, state):
         """Get a custom move from the user"""
+        print("\nRules:", self.describe_rules())
         while True:
             try:
-                print("\nAvailable moves:", state.moves)
-                move_str = input("Enter your move in format (row, number_of_objects): ")
+                print("\nAvailable moves:", self.listed_moves(state))
+                move_str = input(f"Enter your move in format {self.move_format}: ")
                 move = eval(move_str)
                 
                 # Validate the move
-                if not isinstance(move, tuple) or len(move) != 2:
-                    print("Move must be a tuple of two numbers")
-                    continue
-                    
-                row, num = move
-                if not isinstance(row, int) or not isinstance(num, int):
-                    print("Row and number of objects must be integers")
-                    continue
-                    
-                if row < 0 or row >= len(state.board):
-                    print(f"Row must be between 0 and {len(state.board)-1}")
-                    continue
-                    
-                if num < 1 or num > state.board[row]:
-                    print(f"Number of objects must be between 1 and {state.board[row]}")
+                if not self.is_legal(state, move):
+                    print(f"{move_str.strip()} is not a legal move")
                     continue
                     
                 return move
                 
             except (SyntaxError, NameError):
-                print("Invalid input format. Please enter in format (row, number_of_objects)")
+                print(f"Invalid input format. Please enter in format {self.move_format}")
             except Exception as e:
                 print(f"Error: {str(e)}")
 
     def actions(self, state):
-        """Legal moves are at least one object, all from the same row."""
+        """Legal moves are at least one object, all from the same row.
+        They are kept as a range per row (see NimMoves), not listed."""
         return state.moves
 
+    def is_legal(self, state, move):
+        """A move is legal if it is in the range of its row (see NimMoves)."""
+        return move in state.moves
+
     def result(self, state, move):
         """Return the state that results from making a move from a state."""
-        board = state.board.copy()
-        board[move[0]] -= move[1]
-        moves = [(x, y) for x in range(len(board)) 
-                 for y in range(1,board[x]+1)]
+        x, y = move
+        board = state.board
+        board = board[:x] + (board[x] - y,) + board[x + 1:]
+        total = state.total - y
         next = 'P1' if state.to_move == 'COMP' else 'COMP'
-        utility = self.compute_utility(board, next)
-        return GameState(to_move=next, 
-                         utility=utility,
-                         board=board, moves=moves)
+        utility = self.compute_utility(board, next) if total == 0 else 0
+        return NimState(to_move=next, utility=utility, board=board, total=total)
 
     def utility(self, state, player):
         """Return the value to player; 1 for win, -1 for loss, 0 otherwise."""
@@ -133,7 +445,23 @@ class GameOfNim(Game):
 
     def terminal_test(self, state):
         """A state is terminal if there are no objects left"""
-        return len(state.moves) == 0
+        return state.total == 0
+
+    def state_key(self, state):
+        """Boards that are permutations of each other, or differ only by empty
+        rows, share a key. Moves stored under a key are only hints for
+        another board with the same key, since its rows may be numbered
+        differently."""
+        return canonical_key(state.board), state.to_move
+
+    def order_actions(self, state, actions):
+        """Try moves that leave a nim sum of 0 first, then larger takes,
+        which bring the game to an end sooner."""
+        nim_sum = 0
+        for stack in state.board:
+            nim_sum ^= stack
+        board = state.board
+        return sorted(actions, key=lambda m: (board[m[0]] - m[1] != board[m[0]] ^ nim_sum, -m[1]))
 
     def display(self, state):
         """Print the current board state"""
@@ -141,17 +469,22 @@ class GameOfNim(Game):
         print("board: ", board)
 
     def compute_utility(self, board, player):
-        """Compute the utility of a board state for a player"""
-        return 1 if self.terminal_test(GameState(player, 0, board, [])) else 0
+        """Compute the utility of a board state for COMP. player is the one
+        to move next, so on an empty board the other player took the last
+        object and won (or, in misere play, lost)."""
+        if any(board):
+            return 0
+        if self.misere:
+            return 1 if player == 'COMP' else -1
+        return -1 if player == 'COMP' else 1
 
 def query_player_with_claude(game, state):
     """Make a move by querying the user and showing both Claude's and evaluation function's suggestions"""
     print("\nCurrent state:")
     game.display(state)
     
-    # Get suggestions from both sources
-    claude_suggestion = game.get_claude_suggestion(state)
-    eval_suggestion = game.get_eval_suggestion(state)
+    # Get suggestions from both sources at the same time
+    claude_suggestion, eval_suggestion = game.get_suggestions(state)
     
     # Display suggestions
     game.display_suggestions(claude_suggestion, eval_suggestion)
@@ -161,9 +494,8 @@ def query_player_with_claude(game, state):
     return move
 
 def get_heuristic(state, move):
-    board = state.board.copy()
+    board = list(state.board)
     board[move[0]] -= move[1]
-    print(board)
     result = 0
     for stack in board:
         result ^= int(stack)
@@ -172,16 +504,21 @@ def get_heuristic(state, move):
 if __name__ == "__main__":
     # Create game instance with initial board [0, 5, 3, 1]
     nim = GameOfNim(board=[0, 5, 3, 1])
+
+    # Answer from the opening book built by opening_book.py, if there is one
+    from opening_book import load_book
+    nim.book = load_book()
     
     # Print initial state
     print(nim.initial.board)  # Should be [0, 5, 3, 1]
-    print(nim.initial.moves)  # Should be [(1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (2, 1), (2, 2), (2, 3), (3, 1)]
+    print(nim.initial.moves)  # Should be (1, 1..5), (2, 1..3), (3, 1..1)
     
     # Test a move
     print(nim.result(nim.initial, (1,2)))
     
-    # Play the game with computer first (using alpha-beta pruning) and human second (with both suggestions)
-    utility = nim.play_game(alpha_beta_player, query_player_with_claude)
+    # Play the game with computer first (using alpha-beta pruning) and human second (with both suggestions).
+    # The computer ponders the human's likely replies while they choose a move.
+    utility = nim.play_game(PonderingPlayer(alpha_beta_player), query_player_with_claude)
     print(utility)
     
     # Print game result
@@ -1,9 +1,14 @@
 """Games or Adversarial Search (Chapter 5)"""
 
-import copy
 import itertools
+import multiprocessing
 import random
-from collections import namedtuple
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
 import numpy as np
 
@@ -11,42 +16,219 @@ from utils import vector_add
 
 GameState = namedtuple('GameState', 'to_move, utility, board, moves')
 StochasticGameState = namedtuple('StochasticGameState', 'to_move, utility, board, moves, chance')
+TTEntry = namedtuple('TTEntry', 'value, flag, depth, move')
+
+# Kinds of value held in a transposition table entry
+EXACT, LOWERBOUND, UPPERBOUND = 'exact', 'lower', 'upper'
+
+# How many nodes negamax_search visits between reads of a shared bound
+SHARED_BOUND_POLL = 256
 
 
 # ______________________________________________________________________________
 # MinMax Search
 
 
-def minmax_decision(state, game):
+def negamax_search(state, game, d=np.inf, cutoff_test=None, eval_fn=None,
+                   tt=None, budget=None, ordering=None, prune=True,
+                   alpha=-np.inf, beta=np.inf, pvs=False, stats=None, shared_beta=None):
+    """The search engine behind minmax_decision, alpha_beta_search and
+    alpha_beta_cutoff_search. Return (best_action, value), with value
+    scored for the player to move at state.
+
+    Max and min nodes are folded into one negamax loop: a node at an odd
+    ply scores the negated value of its children. The tree is walked with
+    an explicit stack rather than recursion, so deep games do not hit the
+    recursion limit. Positions where cutoff_test(state, ply) holds (by
+    default, terminal ones and those more than d plies deep) are scored
+    with eval_fn (by default, the utility for the player to move at the
+    root). With prune=False every move is searched, as in plain minimax.
+    The optional tt, budget and ordering work as described for
+    alpha_beta_cutoff_search. A narrower (alpha, beta) window for state
+    may be given; a value outside it is only a bound on the true value.
+
+    With pvs=True, only the first move at a node is searched with the
+    full window; each later move is first searched with a null window
+    that only tells whether it beats the best so far, and searched again
+    with the full window if it does [Marsland 1986]. This pays off when
+    moves are well ordered, and the more so the fewer distinct values
+    the utilities take.
+
+    A SearchStats passed as stats is filled in with the counts of the
+    search; when it is None the search does no counting at all.
+
+    shared_beta, if given, is a function returning an upper bound on the
+    value of state that may fall while the search runs, such as the best
+    value another process has found so far. It is called every
+    SHARED_BOUND_POLL nodes, and the window of every node on the current
+    path is narrowed to match."""
+
+    if budget is None and getattr(_pondering, 'stop', None) is not None:
+        # On a PonderingPlayer's thread, searches must be cancellable
+        budget = SearchBudget()
+    player = game.to_move(state)
+    inf = np.inf
+    terminal_test, utility, result = game.terminal_test, game.utility, game.result
+
+    def ordered_actions(state, key, ply):
+        actions = game.actions(state)
+        move = tt.best_move(key) if key is not None else None
+        if ordering is not None:
+            return ordering.order(game, state, actions, ply, move)
+        if move is None:
+            return actions
+        actions = list(actions)
+        if move not in actions:
+            return actions
+        return [move] + [a for a in actions if a != move]
+
+    def tighten(limit):
+        """Lower beta at the root to limit, and the windows below it to match."""
+        for frame in stack:
+            if frame[3] % 2:
+                if -limit > frame[1]:
+                    frame[1] = frame[7] = -limit
+            elif limit < frame[2]:
+                frame[2] = limit
+                if frame[5] >= limit:
+                    # Already fails high: search no more moves here
+                    frame[4] = iter(())
+
+    def record(frame):
+        """Store a finished node in the table, scored for the root player."""
+        _, _, beta, ply, _, v, best, alpha0, key = frame[:9]
+        if ply % 2:
+            tt.record(key, -v, -beta, -alpha0, d + 1 - ply, best)
+        else:
+            tt.record(key, v, alpha0, beta, d + 1 - ply, best)
+
+    plain = tt is None and ordering is None
+    # A frame is [state, alpha, beta, ply, actions, value, best_action,
+    # alpha on entry, table key, action being searched, child state,
+    # whether the child is being searched with a null window], with alpha,
+    # beta and value scored for the player to move at that ply.
+    root_key = (game.state_key(state), player) if tt is not None else None
+    stack = [[state, alpha, beta, 0, iter(ordered_actions(state, root_key, 0)),
+              -inf, None, alpha, root_key, None, None, False]]
+    push, pop = stack.append, stack.pop
+    value = None
+    polls = 0
+    if stats is not None:
+        stats.searches += 1
+        stats.count(0)
+        stats.expanded += 1
+        start, hits = time.perf_counter(), (tt.hits if tt is not None else 0)
+    try:
+        while True:
+            if shared_beta is not None:
+                polls += 1
+                if polls % SHARED_BOUND_POLL == 0:
+                    tighten(shared_beta())
+            frame = stack[-1]
+            child = None
+            if value is not None:
+                # Fold in the value of the child just searched
+                u = -value
+                value = None
+                if frame[11] and frame[1] < u < frame[2]:
+                    # The null window failed high: search again for the exact value
+                    frame[11] = False
+                    child, ply = frame[10], frame[3] + 1
+                    alpha, beta = -frame[2], -u
+                    if stats is not None:
+                        stats.nodes += 1
+                elif u > frame[5]:
+                    frame[5] = u
+                    frame[6] = frame[9]
+                    if u >= frame[2]:
+                        if stats is not None:
+                            stats.cutoffs += 1
+                        if ordering is not None:
+                            ordering.cutoff(frame[9], frame[3], 1 if d == inf else d + 1 - frame[3])
+                        frame[4] = iter(())
+                    elif prune and u > frame[1]:
+                        frame[1] = u
+            if child is None:
+                a = next(frame[4], None)
+                if a is None:
+                    # All moves searched (or cut off): return the value to the parent
+                    pop()
+                    if tt is not None:
+                        record(frame)
+                    if not stack:
+                        return frame[6], frame[5]
+                    value = frame[5]
+                    continue
+                frame[9] = a
+                frame[11] = False
+                child = result(frame[0], a)
+                ply = frame[3] + 1
+                if cutoff_test is not None:
+                    leaf = cutoff_test(child, ply)
+                elif ply > d:
+                    leaf = True
+                    if budget is not None and not terminal_test(child):
+                        budget.depth_limited = True
+                else:
+                    leaf = terminal_test(child)
+                if stats is not None:
+                    stats.count(ply, leaf)
+                if leaf:
+                    if budget is not None:
+                        budget.tick()
+                    value = utility(child, player) if eval_fn is None else eval_fn(child)
+                    if ply % 2:
+                        value = -value
+                    continue
+                if pvs and frame[6] is not None:
+                    # Principal variation search: expect the first move to stay
+                    # best, and only test that the others score no more
+                    frame[10], frame[11] = child, True
+                    alpha, beta = -np.nextafter(frame[1], inf), -frame[1]
+                else:
+                    alpha, beta = -frame[2], -frame[1]
+            if budget is not None:
+                budget.tick()
+            if plain:
+                if stats is not None:
+                    stats.expanded += 1
+                push([child, alpha, beta, ply, iter(game.actions(child)),
+                      -inf, None, alpha, None, None, None, False])
+                continue
+            key = None
+            if tt is not None:
+                key = (game.state_key(child), player)
+                if ply % 2:
+                    v, pa, pb = tt.probe(key, d + 1 - ply, -beta, -alpha, budget)
+                    alpha, beta = -pb, -pa
+                    v = None if v is None else -v
+                else:
+                    v, alpha, beta = tt.probe(key, d + 1 - ply, alpha, beta, budget)
+                if v is not None:
+                    value = v
+                    continue
+            if stats is not None:
+                stats.expanded += 1
+            push([child, alpha, beta, ply, iter(ordered_actions(child, key, ply)),
+                  -inf, None, alpha, key, None, None, False])
+    finally:
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
+            if tt is not None:
+                stats.tt_hits += tt.hits - hits
+
+
+def minmax_decision(state, game, stats=None):
     """Given a state in a game, calculate the best move by searching
     forward all the way to the terminal states. [Figure 5.3]"""
 
-    player = game.to_move(state)
-
-    def max_value(state):
-        if game.terminal_test(state):
-            return game.utility(state, player)
-        v = -np.inf
-        for a in game.actions(state):
-            v = max(v, min_value(game.result(state, a)))
-        return v
-
-    def min_value(state):
-        if game.terminal_test(state):
-            return game.utility(state, player)
-        v = np.inf
-        for a in game.actions(state):
-            v = min(v, max_value(game.result(state, a)))
-        return v
-
-    # Body of minmax_decision:
-    return max(game.actions(state), key=lambda a: min_value(game.result(state, a)))
+    return negamax_search(state, game, prune=False, stats=stats)[0]
 
 
 # ______________________________________________________________________________
 
 
-def expect_minmax(state, game):
+def expect_minmax(state, game, stats=None):
     """
     [Figure 5.11]
     Return the best move for a player after dice are thrown. The game tree
@@ -54,123 +236,817 @@ def expect_minmax(state, game):
 	"""
     player = game.to_move(state)
 
-    def max_value(state):
+    def max_value(state, depth):
         v = -np.inf
         for a in game.actions(state):
-            v = max(v, chance_node(state, a))
+            v = max(v, chance_node(state, a, depth))
         return v
 
-    def min_value(state):
+    def min_value(state, depth):
         v = np.inf
         for a in game.actions(state):
-            v = min(v, chance_node(state, a))
+            v = min(v, chance_node(state, a, depth))
         return v
 
-    def chance_node(state, action):
+    def chance_node(state, action, depth):
         res_state = game.result(state, action)
+        if stats is not None:
+            stats.count(depth + 1, game.terminal_test(res_state))
         if game.terminal_test(res_state):
             return game.utility(res_state, player)
         sum_chances = 0
-        num_chances = len(game.chances(res_state))
+        if stats is not None:
+            stats.expanded += 1
         for chance in game.chances(res_state):
-            res_state = game.outcome(res_state, chance)
-            util = 0
-            if res_state.to_move == player:
-                util = max_value(res_state)
+            out_state = game.outcome(res_state, chance)
+            if stats is not None:
+                stats.count(depth + 1)
+                stats.expanded += 1
+            if out_state.to_move == player:
+                util = max_value(out_state, depth + 1)
             else:
-                util = min_value(res_state)
+                util = min_value(out_state, depth + 1)
             sum_chances += util * game.probability(chance)
-        return sum_chances / num_chances
+        return sum_chances
 
     # Body of expect_minmax:
-    return max(game.actions(state), key=lambda a: chance_node(state, a), default=None)
-
-
-def alpha_beta_search(state, game):
-    """Search game to determine best action; use alpha-beta pruning.
-    As in [Figure 5.7], this version searches all the way to the leaves."""
+    with timed_search(stats):
+        if stats is not None:
+            stats.count(0)
+            stats.expanded += 1
+        return max(game.actions(state), key=lambda a: chance_node(state, a, 0), default=None)
+
+
+def expect_minmax_cutoff_search(state, game, d=2, eval_fn=None, bounds=(-1, 1),
+                                stats=None):
+    """Return the best move for the player to move after the dice are
+    thrown, looking d moves ahead (counting both players) and scoring the
+    positions reached with eval_fn (by default, game.evaluate for the
+    player to move). Chance nodes are pruned with Star2 [Ballard 1983]:
+    every value must lie within bounds, so after some dice outcomes have
+    been searched the expected value is known to lie in an interval, and
+    the search stops once that interval falls outside (alpha, beta). A
+    cheap probe of one move per outcome tightens the interval first.
+    Chance node values are cached for the duration of the search; a
+    SearchStats given as stats counts cache hits as table hits."""
 
     player = game.to_move(state)
-
-    # Functions used by alpha_beta
-    def max_value(state, alpha, beta):
-        if game.terminal_test(state):
-            return game.utility(state, player)
-        v = -np.inf
-        for a in game.actions(state):
-            v = max(v, min_value(game.result(state, a), alpha, beta))
-            if v >= beta:
-                return v
-            alpha = max(alpha, v)
+    eval_fn = eval_fn or (lambda state: game.evaluate(state, player))
+    lower, upper = bounds
+    cache = {}
+
+    def decision_value(state, actions, depth, alpha, beta):
+        """Alpha-beta over the moves at state, depth moves into the search."""
+        maximize = game.to_move(state) == player
+        v = -np.inf if maximize else np.inf
+        if stats is not None:
+            stats.expanded += 1
+        for a in actions:
+            u = chance_value(game.result(state, a), depth + 1, alpha, beta)
+            if maximize:
+                v = max(v, u)
+                if v >= beta:
+                    if stats is not None:
+                        stats.cutoffs += 1
+                    return v
+                alpha = max(alpha, v)
+            else:
+                v = min(v, u)
+                if v <= alpha:
+                    if stats is not None:
+                        stats.cutoffs += 1
+                    return v
+                beta = min(beta, v)
+        if v in (np.inf, -np.inf):
+            # No legal move for this roll: the turn passes
+            return eval_fn(state)
         return v
 
-    def min_value(state, alpha, beta):
+    def probe_value(state, actions, depth):
+        """The value of the first move at state: a lower bound on its value
+        if player is to move there, otherwise an upper bound."""
+        if not actions:
+            return eval_fn(state)
+        return chance_value(game.result(state, actions[0]), depth + 1, lower, upper)
+
+    def chance_value(state, depth, alpha, beta):
+        """The expected value of state over the dice, or a bound on it
+        beyond alpha or beta."""
+        if stats is not None:
+            stats.count(depth, depth >= d or game.terminal_test(state))
         if game.terminal_test(state):
             return game.utility(state, player)
-        v = np.inf
+        if depth >= d:
+            return eval_fn(state)
+        key = (game.state_key(state), depth)
+        if key in cache:
+            if stats is not None:
+                stats.tt_hits += 1
+            return cache[key]
+        chances = game.chances(state)
+        probs = [game.probability(c) for c in chances]
+        outcomes = [game.outcome(state, c) for c in chances]
+        if stats is not None:
+            stats.expanded += 1
+            for _ in outcomes:
+                stats.count(depth)
+        actions = [list(game.actions(out_state)) for out_state in outcomes]
+        lo = [lower] * len(chances)
+        hi = [upper] * len(chances)
+        # Star2 probing: bound each outcome by the value of one move
+        for i, out_state in enumerate(outcomes):
+            if game.to_move(out_state) == player:
+                lo[i] = probe_value(out_state, actions[i], depth)
+            else:
+                hi[i] = probe_value(out_state, actions[i], depth)
+        rest_lo = sum(p * v for p, v in zip(probs, lo))
+        rest_hi = sum(p * v for p, v in zip(probs, hi))
+        if rest_lo >= beta or rest_hi <= alpha:
+            if stats is not None:
+                stats.cutoffs += 1
+            return rest_lo if rest_lo >= beta else rest_hi
+        # Star1: search each outcome with the window that can still matter
+        total = 0
+        for i, out_state in enumerate(outcomes):
+            p = probs[i]
+            rest_lo -= p * lo[i]
+            rest_hi -= p * hi[i]
+            a = (alpha - total - rest_hi) / p
+            b = (beta - total - rest_lo) / p
+            v = decision_value(out_state, actions[i], depth, max(a, lo[i]), min(b, hi[i]))
+            if v <= a or v >= b:
+                if stats is not None:
+                    stats.cutoffs += 1
+                return total + p * v + (rest_hi if v <= a else rest_lo)
+            total += p * v
+        cache[key] = total
+        return total
+
+    # Body of expect_minmax_cutoff_search:
+    best_score, best_action = -np.inf, None
+    with timed_search(stats):
+        if stats is not None:
+            stats.count(0)
+            stats.expanded += 1
         for a in game.actions(state):
-            v = min(v, max_value(game.result(state, a), alpha, beta))
-            if v <= alpha:
-                return v
-            beta = min(beta, v)
-        return v
-
-    # Body of alpha_beta_search:
-    best_score = -np.inf
-    beta = np.inf
-    best_action = None
-    for a in game.actions(state):
-        v = min_value(game.result(state, a), best_score, beta)
-        if v > best_score:
-            best_score = v
-            best_action = a
+            v = chance_value(game.result(state, a), 1, best_score, upper)
+            if v > best_score:
+                best_score, best_action = v, a
     return best_action
 
 
-def alpha_beta_cutoff_search(state, game, d=4, cutoff_test=None, eval_fn=None):
+def alpha_beta_search(state, game, tt=None, ordering=None, budget=None, stats=None):
     """Search game to determine best action; use alpha-beta pruning.
-    This version cuts off search and uses an evaluation function."""
+    As in [Figure 5.7], this version searches all the way to the leaves.
+    If a TranspositionTable tt is given, positions already solved (in this
+    or an earlier call) are looked up instead of being searched again.
+    A MoveOrdering decides which moves are tried first at each node."""
 
-    player = game.to_move(state)
+    return negamax_search(state, game, tt=tt, budget=budget, ordering=ordering,
+                          stats=stats)[0]
 
-    # Functions used by alpha_beta
-    def max_value(state, alpha, beta, depth):
-        if cutoff_test(state, depth):
-            return eval_fn(state)
-        v = -np.inf
-        for a in game.actions(state):
-            v = max(v, min_value(game.result(state, a), alpha, beta, depth + 1))
-            if v >= beta:
-                return v
-            alpha = max(alpha, v)
-        return v
 
-    def min_value(state, alpha, beta, depth):
-        if cutoff_test(state, depth):
-            return eval_fn(state)
-        v = np.inf
-        for a in game.actions(state):
-            v = min(v, max_value(game.result(state, a), alpha, beta, depth + 1))
-            if v <= alpha:
-                return v
-            beta = min(beta, v)
-        return v
+def alpha_beta_cutoff_search(state, game, d=4, cutoff_test=None, eval_fn=None,
+                             tt=None, budget=None, ordering=None, pvs=False, stats=None):
+    """Search game to determine best action; use alpha-beta pruning.
+    This version cuts off search and uses an evaluation function.
+    A TranspositionTable tt is used both to skip positions searched deeply
+    enough before and to try the best move found for a position first.
+    A SearchBudget makes the search raise SearchTimeout when it runs out.
+    A MoveOrdering decides which moves are tried first at each node.
+    pvs=True selects principal variation search (see negamax_search).
+    A SearchStats given as stats is filled in with the search counts."""
 
-    # Body of alpha_beta_cutoff_search starts here:
     # The default test cuts off at depth d or at a terminal state
-    cutoff_test = (cutoff_test or (lambda state, depth: depth > d or game.terminal_test(state)))
-    eval_fn = eval_fn or (lambda state: game.utility(state, player))
-    best_score = -np.inf
-    beta = np.inf
-    best_action = None
-    for a in game.actions(state):
-        v = min_value(game.result(state, a), best_score, beta, 1)
-        if v > best_score:
-            best_score = v
-            best_action = a
+    return negamax_search(state, game, d, cutoff_test, eval_fn, tt, budget, ordering,
+                          pvs=pvs, stats=stats)[0]
+
+
+def parallel_alpha_beta_search(state, game, d=np.inf, eval_fn=None, workers=None,
+                               stats=None, pool=None):
+    """Search game like alpha_beta_search (or alpha_beta_cutoff_search, if
+    a depth d is given), with the moves at the root split between a pool
+    of worker processes. Workers share the best value found so far, and
+    each one narrows the window of the move it searches as that improves.
+    The game, its states and eval_fn must be picklable. Returns the same
+    move as the serial search: the first best move in game.actions order.
+    A SearchStats given as stats adds up the counts of all the workers.
+    A RootSplitPool given as pool is used instead of starting worker
+    processes for this search alone; it must not run two searches at once."""
+
+    actions = list(game.actions(state))
+    if len(actions) <= 1:
+        return actions[0] if actions else None
+    if pool is None:
+        with RootSplitPool(workers) as pool:
+            return parallel_alpha_beta_search(state, game, d, eval_fn, stats=stats, pool=pool)
+    player = game.to_move(state)
+    with timed_search(stats):
+        pool.reset()
+        futures = [pool.executor.submit(_search_root_move, game, state, player, i, a, d,
+                                        eval_fn, stats is not None)
+                   for i, a in enumerate(actions)]
+        results = [future.result() for future in futures]
+        if stats is not None:
+            stats.count(0)
+            stats.expanded += 1
+            for _, _, worker_stats in results:
+                stats.merge(worker_stats)
+    best_score, best_action = -np.inf, None
+    for a, (v, exact, _) in zip(actions, results):
+        if exact and v > best_score:
+            best_score, best_action = v, a
+    return best_action if best_action is not None else actions[0]
+
+
+class RootSplitPool:
+    """The worker processes of parallel_alpha_beta_search, which may be
+    kept for many searches, and the bound they share: the best value found
+    so far at the root and the index of the move that found it. Call
+    close() when done, or use the pool as a context manager."""
+
+    def __init__(self, workers=None):
+        self.bound = multiprocessing.Array('d', [-np.inf, -1])
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            initializer=_init_root_split_worker,
+                                            initargs=(self.bound,))
+
+    def reset(self):
+        """Forget the bound of the last search."""
+        with self.bound.get_lock():
+            self.bound[0], self.bound[1] = -np.inf, -1
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_root_split_bound = None
+
+
+def _init_root_split_worker(bound):
+    global _root_split_bound
+    _root_split_bound = bound
+
+
+def _search_root_move(game, state, player, i, a, d, eval_fn, counted=False):
+    """Search the ith root move for player in a worker process. Return
+    (value, exact, stats); when exact is False, value is only an upper
+    bound at or below the value of a move that beats this one. stats is
+    a SearchStats for the subtree if counted, else None."""
+    bound = _root_split_bound
+
+    def shared_alpha():
+        with bound.get_lock():
+            best, j = bound[0], bound[1]
+        # A move later in the order only beats this one by scoring more, so
+        # a tie with it must not be pruned away.
+        return best if j < i else np.nextafter(best, -np.inf)
+
+    alpha = shared_alpha()
+    child = game.result(state, a)
+    stats = SearchStats() if counted else None
+    if d < 1 or game.terminal_test(child):
+        v = eval_fn(child) if eval_fn else game.utility(child, player)
+        if stats is not None:
+            stats.count(1, True)
+    else:
+        # Search the reply as the opponent would, scoring for player negated
+        child_eval = ((lambda s: -eval_fn(s)) if eval_fn else
+                      (lambda s: -game.utility(s, player)))
+        # Other workers keep raising the bound while this one searches
+        v = -negamax_search(child, game, d - 1, eval_fn=child_eval, beta=-alpha,
+                            stats=stats, shared_beta=lambda: -shared_alpha())[1]
+        alpha = shared_alpha()
+        if stats is not None:
+            # The subtree hangs one ply below the root searched by the caller,
+            # whose wall clock time is what counts
+            stats.searches, stats.elapsed = 0, 0.0
+            stats.max_depth += 1
+    if v <= alpha:
+        return v, False, stats
+    with bound.get_lock():
+        if v > bound[0] or (v == bound[0] and i < bound[1]):
+            bound[0], bound[1] = v, i
+    return v, True, stats
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search whose SearchBudget has run out."""
+
+
+class SearchBudget:
+    """A wall-clock and/or node allowance for one search. tick() is called
+    once per node and raises SearchTimeout when either limit is passed,
+    or when the search is cancelled by setting the threading.Event stop
+    (by default, the pondering event of the thread the budget is made on).
+    depth_limited records whether some position was cut off by depth
+    rather than searched to the end, so deepening further could help."""
+
+    def __init__(self, time_limit=None, node_limit=None, stop=None):
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.node_limit = node_limit
+        self.stop = stop if stop is not None else getattr(_pondering, 'stop', None)
+        self.nodes = 0
+        self.depth_limited = False
+
+    def tick(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout('node budget of {} exhausted'.format(self.node_limit))
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout('time budget exhausted')
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout('search cancelled')
+
+
+# The stop event of a PonderingPlayer's background thread, as seen from it
+_pondering = threading.local()
+
+
+class SearchStats:
+    """Counts kept by the searches given one: nodes visited (roots and
+    nodes searched a second time included), leaves scored by a utility
+    or evaluation function, beta cutoffs, nodes whose moves were
+    expanded, the deepest ply reached, transposition table hits and
+    elapsed seconds. Counts add up over the searches sharing an object;
+    searches lists how many there were."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.searches = self.nodes = self.leaves = self.cutoffs = 0
+        self.expanded = self.max_depth = self.tt_hits = 0
+        self.elapsed = 0.0
+
+    def count(self, ply, leaf=False):
+        """Count a node visited ply moves below the root."""
+        self.nodes += 1
+        if ply > self.max_depth:
+            self.max_depth = ply
+        if leaf:
+            self.leaves += 1
+
+    def merge(self, other):
+        """Add the counts of another SearchStats to these."""
+        for name in ('searches', 'nodes', 'leaves', 'cutoffs', 'expanded', 'tt_hits',
+                     'elapsed'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.max_depth = max(self.max_depth, other.max_depth)
+
+    @property
+    def branching_factor(self):
+        """The average number of moves searched at an expanded node."""
+        return (self.nodes - self.searches) / self.expanded if self.expanded else 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return dict(searches=self.searches, nodes=self.nodes, leaves=self.leaves,
+                    cutoffs=self.cutoffs, branching_factor=self.branching_factor,
+                    max_depth=self.max_depth, tt_hits=self.tt_hits, elapsed=self.elapsed)
+
+    def __str__(self):
+        return ('{} nodes, {} leaves, {} cutoffs, branching {:.2f}, depth {}, '
+                '{} TT hits, {:.3f}s'.format(self.nodes, self.leaves, self.cutoffs,
+                                             self.branching_factor, self.max_depth,
+                                             self.tt_hits, self.elapsed))
+
+    def __repr__(self):
+        return 'SearchStats({})'.format(', '.join(
+            '{}={!r}'.format(k, v) for k, v in self.as_dict().items()))
+
+
+@contextmanager
+def timed_search(stats):
+    """Count one search in stats, and the time it takes, if stats is given."""
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.searches += 1
+        stats.elapsed += time.perf_counter() - start
+
+
+def iterative_deepening_search(state, game, time_limit=None, node_limit=None,
+                               max_depth=100, cutoff_test=None, eval_fn=None, tt=None,
+                               pvs=False, aspiration=None, stats=None):
+    """Run alpha_beta_cutoff_search to depth 1, 2, 3, ... until time_limit
+    seconds or node_limit nodes are used up, and return the best move of
+    the deepest search that completed. Each iteration leaves its best moves
+    in the transposition table, so the next one searches them first, and
+    killer and history statistics carry over between iterations. Stops
+    early once a search reaches the end of the game everywhere.
+
+    pvs=True selects principal variation search. With an aspiration
+    half-width, each iteration after the first searches the window of
+    that width around the previous score, and only searches again with
+    the full window if the score falls outside it. A SearchStats given as
+    stats adds up the counts of every iteration, the unfinished one too."""
+
+    tt = TranspositionTable() if tt is None else tt
+    budget = SearchBudget(time_limit, node_limit)
+    ordering = MoveOrdering()
+
+    def limit_at(d):
+        def depth_cutoff(state, depth):
+            if game.terminal_test(state):
+                return True
+            if depth > d or cutoff_test(state, depth):
+                budget.depth_limited = True
+                return True
+            return False
+        return depth_cutoff if cutoff_test is not None else None
+
+    def search(d, alpha=-np.inf, beta=np.inf):
+        return negamax_search(state, game, d, limit_at(d), eval_fn, tt, budget, ordering,
+                              alpha=alpha, beta=beta, pvs=pvs, stats=stats)
+
+    best_action = next(iter(game.actions(state)), None)
+    score = None
+    for d in range(1, max_depth + 1):
+        budget.depth_limited = False
+        try:
+            if aspiration is None or score is None:
+                move, score = search(d)
+            else:
+                alpha, beta = score - aspiration, score + aspiration
+                move, score = search(d, alpha, beta)
+                if score <= alpha or score >= beta:
+                    move, score = search(d)
+        except SearchTimeout:
+            break
+        if move is not None:
+            best_action = move
+        if not budget.depth_limited:
+            break
     return best_action
 
 
+# ______________________________________________________________________________
+# Transposition Tables
+
+
+class LRUCache:
+    """A bounded mapping that evicts the least recently used key once more
+    than maxsize are stored. get() counts hits and misses; peek() and
+    touch() let a caller decide for itself what counts as a hit. Each step
+    is atomic, so a cache can be shared with a pondering thread."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the value stored under key, or None, marking it as used."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touch(key)
+        return value
+
+    def peek(self, key):
+        """Return the value stored under key, or None, without marking it."""
+        return self.entries.get(key)
+
+    def touch(self, key):
+        """Mark key as the most recently used."""
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            # Evicted meanwhile by another thread
+            pass
+
+    def put(self, key, value):
+        """Store value under key, evicting the oldest keys if full."""
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.maxsize:
+            try:
+                self.entries.popitem(last=False)
+            except KeyError:
+                break
+
+    def clear(self):
+        """Forget every entry and reset the counters."""
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class TranspositionTable:
+    """A bounded cache of searched positions, shared between searches.
+    Keys come from Game.state_key; each entry records a value that is
+    EXACT, a LOWERBOUND or an UPPERBOUND on the true value, the depth it
+    was searched to (np.inf for a search to the leaves) and the best move
+    found. Entries are kept in an LRUCache of maxsize positions. The hits
+    and misses counters help with sizing."""
+
+    def __init__(self, maxsize=100000):
+        self.entries = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        return self.entries.maxsize
+
+    def lookup(self, key, depth=0):
+        """Return the entry for key if it was searched at least depth deep."""
+        entry = self.entries.peek(key)
+        if entry is None or entry.depth < depth:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.touch(key)
+        return entry
+
+    def probe(self, key, depth, alpha, beta, budget=None):
+        """Look key up for a search of the given depth with window
+        (alpha, beta). Return (value, alpha, beta): value is None unless the
+        entry settles the position, and the window is narrowed by any bound.
+        A hit on a depth-limited entry is noted on the budget, if any."""
+        entry = self.lookup(key, depth)
+        if entry is None:
+            return None, alpha, beta
+        if budget is not None and entry.depth != np.inf:
+            budget.depth_limited = True
+        if entry.flag == EXACT:
+            return entry.value, alpha, beta
+        if entry.flag == LOWERBOUND:
+            alpha = max(alpha, entry.value)
+        else:
+            beta = min(beta, entry.value)
+        return (entry.value if alpha >= beta else None), alpha, beta
+
+    def record(self, key, value, alpha, beta, depth, move=None):
+        """Store value as searched with window (alpha, beta), as a bound if
+        it fell outside the window."""
+        flag = UPPERBOUND if value <= alpha else LOWERBOUND if value >= beta else EXACT
+        self.store(key, value, flag, depth, move)
+
+    def best_move(self, key):
+        """Return the best move recorded for key at any depth, or None."""
+        entry = self.entries.peek(key)
+        return None if entry is None else entry.move
+
+    def store(self, key, value, flag, depth, move=None):
+        """Record the result of searching key, evicting the oldest entry if full."""
+        self.entries.put(key, TTEntry(value, flag, depth, move))
+
+    def clear(self):
+        """Forget every entry and reset the counters."""
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def hit_rate(self):
+        """Fraction of lookups that found a usable entry."""
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return '<TranspositionTable: {} entries, {} hits, {} misses>'.format(
+            len(self), self.hits, self.misses)
+
+
+# ______________________________________________________________________________
+# Move Ordering
+
+
+class MoveOrdering:
+    """Decides the order in which alpha-beta tries the moves at a node.
+    The transposition table's best move comes first, then the killer moves
+    that caused a cutoff at the same ply elsewhere in the tree, then the
+    rest by how often they caused cutoffs (the history heuristic). Ties
+    keep the order given by the game's own order_actions hook."""
+
+    def __init__(self, killers_per_ply=2):
+        self.killers_per_ply = killers_per_ply
+        self.killers = defaultdict(list)
+        self.history = defaultdict(int)
+
+    def order(self, game, state, actions, ply, tt_move=None):
+        """Return the actions of state sorted best-first."""
+        actions = game.order_actions(state, actions)
+        killers = self.killers.get(ply, ())
+        history = self.history
+
+        def rank(move):
+            if move == tt_move:
+                return 0, 0
+            if move in killers:
+                return 1, killers.index(move)
+            return 2, -history.get(move, 0)
+
+        return sorted(actions, key=rank)
+
+    def cutoff(self, move, ply, depth=1):
+        """Note that move caused a cutoff at ply with depth plies left below."""
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.killers_per_ply:]
+        self.history[move] += depth * depth
+
+    def clear(self):
+        """Forget all killer moves and history counts."""
+        self.killers.clear()
+        self.history.clear()
+
+
+# ______________________________________________________________________________
+# Monte Carlo Tree Search
+
+
+class MCTNode:
+    """A node of the tree grown by MCTSPlayer. A decision node holds a
+    state whose player chooses among the actions; in a StochasticGame, a
+    chance node holds the state after a move, before the dice are rolled.
+    total sums the utilities of the playouts through the node for the
+    player who moved into it."""
+
+    def __init__(self, state, parent=None, player=None, chance=False):
+        self.state = state
+        self.parent = parent
+        self.player = player
+        self.chance = chance
+        self.children = {}
+        self.untried = None
+        self.visits = 0
+        self.total = 0.0
+
+
+class MCTSPlayer:
+    """A player that chooses moves by Monte Carlo tree search with the UCT
+    selection rule [Kocsis and Szepesvari 2006]. Each move gets a budget
+    of iterations, or time_limit seconds when one is given. The tree is
+    kept between moves, so the search picks up where it left off once
+    the opponent has replied. With workers > 1, each round selects that
+    many leaves and plays them out in parallel in a process pool; call
+    close() when done. Works with any Game, including StochasticGame,
+    whose chance outcomes are sampled by their probability. A SearchStats
+    given as stats counts the tree nodes walked through by each move's
+    search, and the playouts as leaves."""
+
+    def __init__(self, iterations=1000, time_limit=None, c=np.sqrt(2), workers=1,
+                 rollout_limit=500, seed=None, stats=None):
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.c = c
+        self.workers = workers
+        self.rollout_limit = rollout_limit
+        self.random = random.Random(seed)
+        self.root = None
+        self.executor = None
+        self.stats = stats
+
+    def __call__(self, game, state):
+        root = self.find_root(game, state)
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        done = 0
+        with timed_search(self.stats):
+            while (time.perf_counter() < deadline) if deadline is not None else (done < self.iterations):
+                leaves = [self.select(game, root) for _ in range(max(1, self.workers))]
+                for leaf, end in zip(leaves, self.rollouts(game, leaves)):
+                    self.backup(game, leaf, end)
+                done += len(leaves)
+        if not root.children:
+            return random_player(game, state)
+        action, child = max(root.children.items(), key=lambda item: item[1].visits)
+        self.root = child
+        return action
+
+    def find_root(self, game, state):
+        """Return the node for state in the tree kept from the last move
+        (at most two moves and their dice rolls down), or a fresh tree."""
+        key = game.state_key(state)
+        frontier = [self.root] if self.root is not None else []
+        for _ in range(5):
+            for node in frontier:
+                if not node.chance and game.state_key(node.state) == key and node.state == state:
+                    node.parent = None
+                    self.root = node
+                    return node
+            frontier = [child for node in frontier for child in node.children.values()]
+        self.root = MCTNode(state)
+        return self.root
+
+    def select(self, game, node):
+        """Walk down by UCT, roll dice at chance nodes, and return a newly
+        added node (or a terminal one) to play out from."""
+        stochastic = isinstance(game, StochasticGame)
+        while not game.terminal_test(node.state):
+            if node.chance:
+                chance = _sample_chance(game, node.state, self.random)
+                child = node.children.get(chance)
+                if child is None:
+                    child = MCTNode(game.outcome(node.state, chance), node)
+                    node.children[chance] = child
+                    return child
+                node = child
+                continue
+            if node.untried is None:
+                node.untried = list(game.actions(node.state))
+                self.random.shuffle(node.untried)
+            if node.untried:
+                action = node.untried.pop()
+                state = game.result(node.state, action)
+                child = MCTNode(state, node, game.to_move(node.state),
+                                stochastic and not game.terminal_test(state))
+                node.children[action] = child
+                return child
+            if not node.children:
+                return node
+            log_n = np.log(node.visits)
+            node = max(node.children.values(),
+                       key=lambda n: (n.total / n.visits + self.c * np.sqrt(log_n / n.visits)
+                                      if n.visits else np.inf))
+        return node
+
+    def rollouts(self, game, leaves):
+        """Play out a random game from each leaf; return the final states."""
+        tasks = [(game, leaf.state, leaf.chance, self.rollout_limit, self.random.random())
+                 for leaf in leaves]
+        if self.workers <= 1:
+            return [_rollout(*task) for task in tasks]
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return list(self.executor.map(_rollout, *zip(*tasks)))
+
+    def backup(self, game, node, end):
+        """Add the outcome of a playout to every node on the path to node."""
+        utilities = {}
+        if self.stats is not None:
+            ply, parent = 0, node.parent
+            while parent is not None:
+                ply, parent = ply + 1, parent.parent
+            self.stats.count(ply, True)
+            self.stats.nodes += ply
+        while node is not None:
+            node.visits += 1
+            if node.player is not None:
+                if node.player not in utilities:
+                    utilities[node.player] = game.utility(end, node.player)
+                node.total += utilities[node.player]
+            node = node.parent
+
+    def close(self):
+        """Shut down the rollout workers, if any."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['root'] = state['executor'] = None
+        return state
+
+
+def _sample_chance(game, state, rng):
+    chances = game.chances(state)
+    return rng.choices(chances, weights=[game.probability(c) for c in chances])[0]
+
+
+def _rollout(game, state, chance, limit, seed):
+    """Play random moves from state (rolling the dice first if chance) for
+    at most limit moves, and return the state reached."""
+    rng = random.Random(seed)
+    stochastic = isinstance(game, StochasticGame)
+    for _ in range(limit):
+        if game.terminal_test(state):
+            break
+        if chance:
+            state = game.outcome(state, _sample_chance(game, state, rng))
+        actions = game.actions(state)
+        if not isinstance(actions, Sequence):
+            actions = list(actions)
+        if not actions:
+            break
+        state = game.result(state, rng.choice(actions))
+        chance = stochastic
+    return state
+
+
 # ______________________________________________________________________________
 # Players for Games
 
@@ -179,10 +1055,11 @@ def query_player(game, state):
     """Make a move by querying standard input."""
     print("current state:")
     game.display(state)
-    print("available moves: {}".format(game.actions(state)))
+    actions = list(game.actions(state))
+    print("available moves: {}".format(actions))
     print("")
     move = None
-    if game.actions(state):
+    if actions:
         move_string = input('Your move? ')
         try:
             move = eval(move_string)
@@ -195,11 +1072,54 @@ def query_player(game, state):
 
 def random_player(game, state):
     """A player that chooses a legal move at random."""
-    return random.choice(game.actions(state)) if game.actions(state) else None
+    actions = game.actions(state)
+    if not isinstance(actions, Sequence):
+        actions = list(actions)
+    return random.choice(actions) if actions else None
 
 
 def alpha_beta_player(game, state):
-    return alpha_beta_search(state, game)
+    move = game.book_move(state)
+    if move is not None:
+        return move
+    return alpha_beta_search(state, game, tt=game.transposition_table,
+                             ordering=MoveOrdering())
+
+
+def iterative_deepening_player(game, state):
+    return iterative_deepening_search(state, game, time_limit=1.0,
+                                      tt=game.transposition_table)
+
+
+class ParallelAlphaBetaPlayer:
+    """A player that chooses moves by parallel_alpha_beta_search, to
+    depth d with eval_fn if given, in a pool of worker processes started
+    at its first move and kept for the rest; call close() when done. A
+    SearchStats given as stats adds up the counts of every move's search."""
+
+    def __init__(self, workers=None, d=np.inf, eval_fn=None, stats=None):
+        self.workers = workers
+        self.d = d
+        self.eval_fn = eval_fn
+        self.stats = stats
+        self.pool = None
+
+    def __call__(self, game, state):
+        if self.pool is None:
+            self.pool = RootSplitPool(self.workers)
+        return parallel_alpha_beta_search(state, game, self.d, self.eval_fn,
+                                          stats=self.stats, pool=self.pool)
+
+    def close(self):
+        """Shut down the workers, if any."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
 
 
 def minmax_player(game,state):
@@ -210,6 +1130,134 @@ def expect_minmax_player(game, state):
     return expect_minmax(state, game)
 
 
+def expect_minmax_cutoff_player(game, state):
+    return expect_minmax_cutoff_search(state, game)
+
+
+def stop_pondering(players):
+    """Stop the background search of every PonderingPlayer in players."""
+    for player in players:
+        if isinstance(player, PonderingPlayer):
+            player.stop()
+
+
+class PonderingPlayer:
+    """Wrap a player so that it thinks on the opponent's time. After each
+    move, a background thread searches the positions the opponent's likely
+    replies lead to (the first `replies` in game.order_actions order, all
+    of them by default) and caches the move player chooses in each. If the
+    real reply is among them, the next move is played at once; if it is
+    the one being searched, the search is allowed to finish. The rest of
+    the pondering is cancelled when the real reply arrives: searches built
+    on SearchBudget (all of the alpha-beta ones) raise SearchTimeout at
+    their next node. In a StochasticGame the opponent's chance comes first,
+    most likely first, then its replies, then player's own. Call stop()
+    when done; play_game does so. An exception raised while pondering is
+    raised again by stop()."""
+
+    def __init__(self, player=alpha_beta_player, replies=None):
+        self.player = player
+        self.replies = replies
+        self.cache = {}
+        self.lock = threading.Condition()
+        self.thread = None
+        self.stop_event = None
+        self.pondering = None
+        self.error = None
+        self.hits = self.misses = 0
+
+    def __call__(self, game, state):
+        key = game.state_key(state)
+        with self.lock:
+            while self.pondering == key:
+                self.lock.wait()
+        self.stop()
+        # Equivalent states share a key, but the move must be for this one
+        position, move = self.cache.pop(key, (None, None))
+        self.cache.clear()
+        if move is None or position != state:
+            self.misses += 1
+            move = self.player(game, state)
+        else:
+            self.hits += 1
+        after = game.result(state, move)
+        if not game.terminal_test(after):
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(target=self._ponder, daemon=True,
+                                           args=(game, after, self.stop_event))
+            self.thread.start()
+        return move
+
+    def _ponder(self, game, state, stop):
+        try:
+            self.ponder(game, state, stop)
+        except BaseException as e:
+            self.error = e
+
+    def ponder(self, game, state, stop):
+        """Search the positions after the likely replies at state until
+        they are all done or stop is set."""
+        _pondering.stop = stop
+        stochastic = isinstance(game, StochasticGame)
+        if stochastic:
+            chances = sorted(game.chances(state), key=game.probability, reverse=True)
+            states = [game.outcome(state, c) for c in chances]
+        else:
+            states = [state]
+        for state in states:
+            if self._ponder_replies(game, state, stop, stochastic):
+                return
+
+    def _ponder_replies(self, game, state, stop, stochastic):
+        """Ponder the likely replies at state; return True once stop is set."""
+        replies = game.order_actions(state, list(game.actions(state)))
+        for reply in replies[:self.replies]:
+            position = game.result(state, reply)
+            if stochastic and not game.terminal_test(position):
+                positions = [game.outcome(position, c) for c in game.chances(position)]
+            else:
+                positions = [position]
+            for position in positions:
+                if game.terminal_test(position):
+                    continue
+                key = game.state_key(position)
+                with self.lock:
+                    if stop.is_set():
+                        return True
+                    self.pondering = key
+                try:
+                    move = self.player(game, position)
+                except SearchTimeout:
+                    move = None
+                with self.lock:
+                    self.pondering = None
+                    if move is not None and not stop.is_set():
+                        self.cache[key] = position, move
+                    self.lock.notify_all()
+        return False
+
+    def stop(self):
+        """Cancel any pondering and wait for its thread to finish, raising
+        any exception the pondering raised."""
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(lock=None, thread=None, stop_event=None, pondering=None, error=None,
+                     cache={})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Condition()
+
+
 # ______________________________________________________________________________
 # Some Sample Games
 
@@ -221,12 +1269,23 @@ class Game:
     result, utility, and terminal_test. You may override display and
     successors or you can inherit their default methods. You will also
     need to set the .initial attribute to the initial state; this can
-    be done in the constructor."""
+    be done in the constructor. Set .transposition_table to a
+    TranspositionTable to let alpha_beta_player reuse work across the
+    moves of a game; play_game clears it when a new game starts."""
+
+    transposition_table = None
 
     def actions(self, state):
-        """Return a list of the allowable moves at this point."""
+        """Return the allowable moves at this point, as a list or any
+        other iterable."""
         raise NotImplementedError
 
+    def is_legal(self, state, move):
+        """Return True if move is allowed in state, for checking moves
+        that come from outside the search, such as a user's. Override it
+        where the moves can be checked without listing them."""
+        return move in self.actions(state)
+
     def result(self, state, move):
         """Return the state that results from making a move from a state."""
         raise NotImplementedError
@@ -243,6 +1302,28 @@ class Game:
         """Return the player whose move it is in this state."""
         return state.to_move
 
+    def state_key(self, state):
+        """Return a hashable key identifying state, for transposition tables.
+        Equivalent states (say, mirror images) may share a key if they have
+        the same value; a move stored under the key is then only a hint for
+        the others, as it may not mean the same there."""
+        return state
+
+    def order_actions(self, state, actions):
+        """Return actions with the most promising ones first. Alpha-beta
+        prunes most when the best move is tried first."""
+        return actions
+
+    def book_move(self, state):
+        """Return the move an opening book gives for state, or None if the
+        game has no book or the book does not know state."""
+        return None
+
+    def evaluate(self, state, player):
+        """Estimate the value of state to player, for searches that stop
+        before the end of the game. Defaults to the utility."""
+        return self.utility(state, player)
+
     def display(self, state):
         """Print or otherwise display the state."""
         print(state)
@@ -250,16 +1331,28 @@ class Game:
     def __repr__(self):
         return '<{}>'.format(self.__class__.__name__)
 
+    def __getstate__(self):
+        """Leave the transposition table behind when a game is pickled,
+        e.g. to be sent to a worker process."""
+        state = self.__dict__.copy()
+        state.pop('transposition_table', None)
+        return state
+
     def play_game(self, *players):
         """Play an n-person, move-alternating game."""
         state = self.initial
-        while True:
-            for player in players:
-                move = player(self, state)
-                state = self.result(state, move)
-                if self.terminal_test(state):
-                    self.display(state)
-                    return self.utility(state, self.to_move(self.initial))
+        if self.transposition_table is not None:
+            self.transposition_table.clear()
+        try:
+            while True:
+                for player in players:
+                    move = player(self, state)
+                    state = self.result(state, move)
+                    if self.terminal_test(state):
+                        self.display(state)
+                        return self.utility(state, self.to_move(self.initial))
+        finally:
+            stop_pondering(players)
 
 
 class StochasticGame(Game):
@@ -283,15 +1376,20 @@ class StochasticGame(Game):
     def play_game(self, *players):
         """Play an n-person, move-alternating stochastic game."""
         state = self.initial
-        while True:
-            for player in players:
-                chance = random.choice(self.chances(state))
-                state = self.outcome(state, chance)
-                move = player(self, state)
-                state = self.result(state, move)
-                if self.terminal_test(state):
-                    self.display(state)
-                    return self.utility(state, self.to_move(self.initial))
+        if self.transposition_table is not None:
+            self.transposition_table.clear()
+        try:
+            while True:
+                for player in players:
+                    chance = random.choice(self.chances(state))
+                    state = self.outcome(state, chance)
+                    move = player(self, state)
+                    state = self.result(state, move)
+                    if self.terminal_test(state):
+                        self.display(state)
+                        return self.utility(state, self.to_move(self.initial))
+        finally:
+            stop_pondering(players)
 
 
 class Fig52Game(Game):
@@ -385,6 +1483,14 @@ class TicTacToe(Game):
         """A state is terminal if it is won or there are no empty squares."""
         return state.utility != 0 or len(state.moves) == 0
 
+    def state_key(self, state):
+        return frozenset(state.board.items()), state.to_move
+
+    def order_actions(self, state, actions):
+        """Try squares near the center of the board first."""
+        cx, cy = (self.h + 1) / 2, (self.v + 1) / 2
+        return sorted(actions, key=lambda m: abs(m[0] - cx) + abs(m[1] - cy))
+
     def display(self, state):
         board = state.board
         for x in range(1, self.h + 1):
@@ -430,6 +1536,11 @@ class ConnectFour(TicTacToe):
         return [(x, y) for (x, y) in state.moves
                 if x == self.h or (x + 1 , y ) in state.board]
 
+    def order_actions(self, state, actions):
+        """Try the central columns first."""
+        cy = (self.v + 1) / 2
+        return sorted(actions, key=lambda m: abs(m[1] - cy))
+
 class Gomoku(TicTacToe):
     """Also known as Five in a row."""
 
@@ -465,13 +1576,13 @@ class Backgammon(StochasticGame):
             return moves
         legal_moves = []
         for move in moves:
-            board = copy.deepcopy(state.board)
+            board = [point.copy() for point in state.board]
             if self.is_legal_move(board, move, state.chance, player):
                 legal_moves.append(move)
         return legal_moves
 
     def result(self, state, move):
-        board = copy.deepcopy(state.board)
+        board = [point.copy() for point in state.board]
         player = state.to_move
         self.move_checker(board, move[0], state.chance[0], player)
         if len(move) == 2:
@@ -490,6 +1601,28 @@ class Backgammon(StochasticGame):
         """A state is terminal if one player wins."""
         return state.utility != 0
 
+    def state_key(self, state):
+        return (tuple((point['W'], point['B']) for point in state.board),
+                state.to_move, state.chance)
+
+    def evaluate(self, state, player):
+        """Score state by the race, the share of the total pip count (the
+        distance left to bear off) that the opponent has still to cover,
+        less a penalty for blots (points held by a single checker). Lies
+        strictly between the utilities of a loss and a win."""
+        if state.utility != 0:
+            return self.utility(state, player)
+        pips = {'W': 0, 'B': 0}
+        blots = {'W': 0, 'B': 0}
+        for index, point in enumerate(state.board):
+            pips['W'] += point['W'] * (index + 1)
+            pips['B'] += point['B'] * (24 - index)
+            for p in blots:
+                blots[p] += point[p] == 1
+        opponent = 'B' if player == 'W' else 'W'
+        race = (pips[opponent] - pips[player]) / (pips[opponent] + pips[player])
+        return 0.8 * race + 0.2 * (blots[opponent] - blots[player]) / 15
+
     def get_all_moves(self, board, player):
         """All possible moves for a player i.e. all possible ways of
         choosing two checkers of a player from the board for a move
@@ -0,0 +1,316 @@
+"""A local stand-in for the Claude API, for measuring the Claude path of
+the game offline, with latency that is the same from run to run.
+
+    python mock_claude_server.py --port 8765 --latency 0.8 --jitter 0.2 --error-rate 0.05
+    python mock_claude_server.py --benchmark 50 --concurrency 8
+
+It answers POST /v1/messages, streamed as server-sent events when asked,
+and GET /v1/models, as the Messages API does. Each answer waits for the
+latency plus or minus up to the jitter, then a token_delay per token. A
+share of requests, the error rate, fail with 529 Overloaded. Replies are
+either canned text or "engine" replies: the best move from nim_solver for
+the board in the prompt, in the Move: / Explanation: form ClaudeHelper
+parses. Point a helper at the server with
+
+    ClaudeHelper(api_key='test', base_url=server.url)
+
+--benchmark starts a server and measures suggestion latency through
+ClaudeHelper cold, from the response cache, and with concurrent requests."""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from nim_solver import best_move, nim_sum
+
+MODELS = ["claude-3-opus-20240229", "claude-3-5-sonnet-20241022", "claude-3-5-haiku-20241022"]
+
+CANNED_SUGGESTION = ("Move: (0, 1)\n"
+                     "Explanation: Taking a single object keeps the most options open.")
+CANNED_COMPARISON = ("Both moves change the nim sum of the board. Move 1 is the more "
+                     "cautious of the two, while Move 2 aims to leave a nim sum of 0. "
+                     "I would recommend Move 2.")
+
+
+def engine_reply(prompt):
+    """Answer a suggestion or comparison prompt from ClaudeHelper with the
+    moves nim_solver finds for the board in it."""
+    try:
+        state, _ = json.JSONDecoder().raw_decode(prompt, prompt.index('{'))
+        board = list(state["board"])
+    except (ValueError, KeyError, TypeError):
+        return "I could not find a game state in your message."
+    if "Compare these two moves" in prompt:
+        lines = []
+        for label, x, y in re.findall(r'(Move \d): \((\d+), *(\d+)\)', prompt):
+            if int(x) >= len(board):
+                continue
+            after = list(board)
+            after[int(x)] -= int(y)
+            lines.append(f"{label} takes {y} objects from row {x}, leaving a nim sum of "
+                         f"{nim_sum(after)}.")
+        lines.append("A move leaving a nim sum of 0 puts the opponent in a losing position, "
+                     "so I would recommend such a move.")
+        return "\n".join(lines)
+    move = best_move(board)
+    if move is None:
+        return "Move: (0, 1)\nExplanation: The board is empty, so there is no move to make."
+    after = list(board)
+    after[move[0]] -= move[1]
+    return (f"Move: ({move[0]}, {move[1]})\n"
+            f"Explanation: Taking {move[1]} objects from row {move[0]} leaves a nim sum of "
+            f"{nim_sum(after)}, from {nim_sum(board)} before.")
+
+
+class MockClaudeServer(ThreadingHTTPServer):
+    """The mock API server. Requests are served on threads of their own;
+    requests and errors count what was served, for benchmarks."""
+
+    daemon_threads = True
+    # The default backlog of 5 makes bursts of connections wait a second
+    request_queue_size = 128
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.5, jitter=0.0, error_rate=0.0,
+                 replies='engine', token_delay=0.01, api_key=None, seed=None):
+        super().__init__(address, MessagesHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.replies = replies
+        self.token_delay = token_delay
+        self.api_key = api_key
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread and return self."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def draw(self):
+        """Count a request and return (delay before answering, whether it fails)."""
+        with self.lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def reply(self, prompt):
+        if self.replies == 'canned':
+            return CANNED_COMPARISON if "Compare these two moves" in prompt else CANNED_SUGGESTION
+        return engine_reply(prompt)
+
+
+class MessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, kind, message):
+        self.send_json(status, {"type": "error", "error": {"type": kind, "message": message}})
+
+    def authorized(self):
+        if self.server.api_key is None or self.headers.get('x-api-key') == self.server.api_key:
+            return True
+        self.send_error_json(401, "authentication_error", "invalid x-api-key")
+        return False
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/v1/models':
+            return self.send_error_json(404, "not_found_error", f"no route for {self.path}")
+        if not self.authorized():
+            return
+        data = [{"type": "model", "id": model, "display_name": model,
+                 "created_at": "2024-02-29T00:00:00Z"} for model in MODELS]
+        self.send_json(200, {"data": data, "has_more": False,
+                             "first_id": MODELS[0], "last_id": MODELS[-1]})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.send_error_json(400, "invalid_request_error", "body is not JSON")
+        if self.path.split('?')[0] != '/v1/messages':
+            return self.send_error_json(404, "not_found_error", f"no route for {self.path}")
+        if not self.authorized():
+            return
+        try:
+            prompt = "\n".join(m["content"] if isinstance(m["content"], str)
+                               else "".join(block.get("text", "") for block in m["content"])
+                               for m in body["messages"])
+            model = body["model"]
+        except (KeyError, TypeError):
+            return self.send_error_json(400, "invalid_request_error", "messages and model are required")
+
+        delay, failed = self.server.draw()
+        time.sleep(delay)
+        if failed:
+            return self.send_error_json(529, "overloaded_error", "Overloaded")
+        # Split like a tokenizer would, roughly: words with their spaces
+        tokens = re.findall(r'\s*\S+|\s+', self.server.reply(prompt))
+        tokens = tokens[:body.get("max_tokens", len(tokens))]
+        message = {"id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+                   "model": model, "stop_sequence": None,
+                   "usage": {"input_tokens": len(prompt.split()), "output_tokens": len(tokens)}}
+        if body.get("stream"):
+            self.stream(message, tokens)
+        else:
+            time.sleep(self.server.token_delay * len(tokens))
+            self.send_json(200, dict(message, content=[{"type": "text", "text": "".join(tokens)}],
+                                     stop_reason="end_turn"))
+
+    def stream(self, message, tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(kind, data):
+            self.wfile.write(f"event: {kind}\ndata: {json.dumps(dict(type=kind, **data))}\n\n".encode())
+            self.wfile.flush()
+
+        usage = message["usage"]
+        event("message_start", {"message": dict(message, content=[], stop_reason=None,
+                                                usage=dict(usage, output_tokens=1))})
+        event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        for token in tokens:
+            time.sleep(self.server.token_delay)
+            event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": token}})
+        event("content_block_stop", {"index": 0})
+        event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {})
+
+
+def percentiles(times):
+    return "p50 {:.0f} ms, p90 {:.0f} ms, max {:.0f} ms".format(
+        *(np.percentile(times, [50, 90, 100]) * 1000))
+
+
+def benchmark(server, requests=20, concurrency=4, seed=0):
+    """Ask for suggestions on requests random boards through ClaudeHelper
+    and print the latencies: one at a time, again from the response
+    cache, and concurrency at a time with the async client."""
+    from claude_helper import ClaudeHelper
+
+    rng = random.Random(seed)
+    boards = [[rng.randint(1, 9) for _ in range(rng.randint(2, 5))] for _ in range(requests)]
+    states = [{"board": board, "to_move": "P1"} for board in boards]
+    with tempfile.TemporaryDirectory() as directory:
+        claude = ClaudeHelper(cache_path=f"{directory}/responses.sqlite3",
+                              api_key="sk-ant-api-mock", base_url=server.url)
+        for name in ("cold", "cached"):
+            times = []
+            for state in states:
+                start = time.perf_counter()
+                try:
+                    claude.get_suggestions(state)
+                except Exception as e:
+                    print(f"Request failed: {str(e)}")
+                times.append(time.perf_counter() - start)
+            print(f"{name:<8}{percentiles(times)}")
+        print(f"cache   {claude.cache.stats()}")
+
+        # New boards, so that the cache does not answer them
+        states = [{"board": board + [1], "to_move": "P1"} for board in boards]
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(state):
+                async with semaphore:
+                    start = time.perf_counter()
+                    try:
+                        await claude.get_suggestions_async(state)
+                    except Exception as e:
+                        print(f"Request failed: {str(e)}")
+                    return time.perf_counter() - start
+
+            start = time.perf_counter()
+            times = await asyncio.gather(*(one(state) for state in states))
+            return times, time.perf_counter() - start
+
+        times, wall = asyncio.run(run())
+        print(f"x{concurrency:<7}{percentiles(times)}, {len(states) / wall:.1f} requests/s")
+    print(f"server  {server.requests} requests, {server.errors} errors")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help='seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='the latency varies by up to this many seconds either way')
+    parser.add_argument('--token-delay', type=float, default=0.01,
+                        help='seconds between tokens')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of requests that fail with 529 Overloaded')
+    parser.add_argument('--replies', choices=['engine', 'canned'], default='engine')
+    parser.add_argument('--api-key', help='reject requests with any other x-api-key')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='measure N suggestions through ClaudeHelper, then exit')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='concurrent requests for --benchmark')
+    args = parser.parse_args(argv)
+
+    server = MockClaudeServer((args.host, 0 if args.benchmark else args.port), args.latency,
+                              args.jitter, args.error_rate, args.replies, args.token_delay,
+                              args.api_key, args.seed)
+    if args.benchmark:
+        server.start()
+        try:
+            benchmark(server, args.benchmark, args.concurrency,
+                      args.seed if args.seed is not None else 0)
+        finally:
+            server.stop()
+        return
+    print(f"Serving the mock Claude API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Analyse Nim positions in bulk, without the GUI or the Claude API.
+
+Reads boards from a JSONL or CSV file (or stdin) and writes, for each one
+and in the same order, the best move, whether the player to move wins
+with best play, and the nim sum:
+
+    python nim_analyze.py positions.jsonl --out analysis.jsonl
+    cat positions.csv | python nim_analyze.py --format csv --workers 4
+
+A JSONL line is either a list of piles or an object with a "board" list;
+any other fields of the object are copied to the output. A CSV row is a
+list of piles; a header row is skipped. Boards are analysed in chunks by
+a pool of worker processes, with only a few chunks in flight at a time,
+so memory stays bounded however long the input is. Claude is only asked
+for its suggestion too with --claude, which is slow and costs API calls."""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from nim_solver import best_move, is_winning, nim_sum
+
+
+def parse_jsonl(lines):
+    """Yield a dict with a "board" (or an "error") for each JSONL line."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield {"error": f"invalid JSON: {e}"}
+            continue
+        yield record if isinstance(record, dict) else {"board": record}
+
+
+def parse_csv(lines):
+    """Yield a dict with a "board" for each CSV row of pile sizes."""
+    for i, row in enumerate(csv.reader(lines)):
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if not cells:
+            continue
+        try:
+            yield {"board": [int(cell) for cell in cells]}
+        except ValueError:
+            if i > 0:
+                yield {"error": f"invalid row: {row}"}
+
+
+def analyse(record, misere=False):
+    """Add the best move, the verdict and the nim sum to record."""
+    if "error" in record:
+        return record
+    board = record.get("board")
+    if (not isinstance(board, list)
+            or not all(isinstance(pile, int) and pile >= 0 for pile in board)):
+        return dict(record, error="board must be a list of non-negative integers")
+    move = best_move(board, misere)
+    return dict(record,
+                move=list(move) if move is not None else None,
+                verdict="win" if is_winning(board, misere) else "loss",
+                nim_sum=nim_sum(board))
+
+
+def analyse_chunk(records, misere=False):
+    return [analyse(record, misere) for record in records]
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def analyse_stream(records, misere=False, workers=None, chunk_size=1000):
+    """Yield the analysed records in input order. With more than one
+    worker, chunks are analysed in a process pool, at most two per worker
+    in flight."""
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1:
+        for chunk in chunks(records, chunk_size):
+            yield from analyse_chunk(chunk, misere)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks(records, chunk_size):
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(analyse_chunk, chunk, misere))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def add_claude_suggestions(results, claude):
+    """Ask claude for a move for each analysed position too."""
+    for result in results:
+        if "error" not in result and any(result["board"]):
+            try:
+                state = {"board": result["board"], "to_move": result.get("to_move", "COMP")}
+                result["claude_move"], result["claude_explanation"] = claude.get_suggestions(state)
+            except Exception as e:
+                result["claude_error"] = str(e)
+        yield result
+
+
+def write_jsonl(results, out):
+    for result in results:
+        out.write(json.dumps(result) + "\n")
+
+
+def write_csv(results, out):
+    fields = ["board", "move", "verdict", "nim_sum", "error"]
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for result in results:
+        writer.writerow({key: (" ".join(map(str, value)) if isinstance(value, list) else value)
+                         for key, value in result.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", nargs="?", help="JSONL or CSV file (default: stdin)")
+    parser.add_argument("--format", choices=["jsonl", "csv"],
+                        help="input format (default: from the file name, else jsonl)")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    parser.add_argument("--out-format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--misere", action="store_true",
+                        help="the player who takes the last object loses")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--claude", action="store_true",
+                        help="also ask Claude for a move for every position")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.input and args.input.endswith(".csv") else "jsonl")
+    source = open(args.input, newline="") if args.input else sys.stdin
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    try:
+        records = parse_csv(source) if fmt == "csv" else parse_jsonl(source)
+        results = analyse_stream(records, args.misere, args.workers, args.chunk_size)
+        if args.claude:
+            from claude_helper import ClaudeHelper
+            results = add_claude_suggestions(results, ClaudeHelper())
+        (write_csv if args.out_format == "csv" else write_jsonl)(results, out)
+    finally:
+        if args.input:
+            source.close()
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 from game_of_nim import GameOfNim
-from games import GameState
+from games import SearchStats
+from opening_book import load_book
 
 class NimGUI:
     def __init__(self, root):
@@ -83,7 +86,10 @@ class NimGUI:
         # Game state
         self.game = None
         self.current_state = None
-        self.claude_available = False
+        self.claude = None
+        self.claude_warned = False
+        self.book = load_book()
+        self.stream_id = 0
         self.is_ai_turn = False
 
     def toggle_first_option(self, *args):
@@ -95,16 +101,6 @@ class NimGUI:
             self.first_combo.grid_remove()
 
     def start_game(self):
-        # check Claude API
-        try:
-            from claude_helper import ClaudeHelper
-            test_claude = ClaudeHelper()
-            test_claude.get_suggestions({"board": [3, 4, 5], "to_move": "P1"})
-            self.claude_available = True
-        except Exception as e:
-            print(f"Claude API not available: {str(e)}")
-            self.claude_available = False
-            messagebox.showwarning("Warning", "Claude API is not available. Suggestions will be limited to evaluation function only.")
         self.setup_game()
         self.move_button.config(state=tk.NORMAL)
         self.suggestions_button.config(state=tk.NORMAL)
@@ -127,18 +123,32 @@ class NimGUI:
         self.start_button.config(state=tk.NORMAL)
 
     def setup_game(self):
-        self.game = GameOfNim(board=[3, 4, 5], use_claude=self.claude_available)
-        moves = [(x, y) for x in range(3) for y in range(1, [3, 4, 5][x]+1)]
+        self.stream_id += 1  # drop any suggestions still streaming in
+        # Claude connects in the background; a helper that connected is
+        # shared with the games after this one
+        self.game = GameOfNim(board=[3, 4, 5], claude=self.claude, health_check=True)
+        self.game.book = self.book
+        self.check_claude()
         if self.mode_var.get() == "PvE":
             if self.first_var.get() == "AI":
-                self.current_state = GameState(to_move='COMP', utility=0, board=[3, 4, 5], moves=moves)
+                self.current_state = self.game.initial._replace(to_move='COMP')
             else:
-                self.current_state = GameState(to_move='P1', utility=0, board=[3, 4, 5], moves=moves)
+                self.current_state = self.game.initial._replace(to_move='P1')
         else:
-            self.current_state = GameState(to_move='P1', utility=0, board=[3, 4, 5], moves=moves)
+            self.current_state = self.game.initial._replace(to_move='P1')
         self.update_ui()
         self.root.after(100, self.after_update)
 
+    def check_claude(self):
+        available = self.game.claude_available
+        if available is None:
+            self.root.after(200, self.check_claude)
+        elif available:
+            self.claude = self.game.claude
+        elif not self.claude_warned:
+            self.claude_warned = True
+            messagebox.showwarning("Warning", "Claude API is not available. Suggestions will be limited to evaluation function only.")
+
     def update_ui(self):
         for i in range(3):
             self.pile_labels[i].config(text=f"Pile {i}: {self.current_state.board[i]} objects")
@@ -169,12 +179,9 @@ class NimGUI:
             if not (0 <= pile < len(self.current_state.board)):
                 messagebox.showerror("Error", "Invalid pile selection")
                 return
-            if not (1 <= objects <= self.current_state.board[pile]):
-                messagebox.showerror("Error", "Invalid number of objects")
-                return
             move = (pile, objects)
-            if move not in self.current_state.moves:
-                messagebox.showerror("Error", "Invalid move")
+            if not self.game.is_legal(self.current_state, move):
+                messagebox.showerror("Error", f"Invalid move. {self.game.describe_rules()}")
                 return
             self.current_state = self.game.result(self.current_state, move)
             self.update_ui()
@@ -192,59 +199,95 @@ class NimGUI:
 
     def get_suggestions(self):
         try:
-            print(f"DEBUG: claude_available = {self.claude_available}, mode = {self.mode_var.get()}")
+            print(f"DEBUG: claude_available = {self.game.claude_available}, mode = {self.mode_var.get()}")
             print(f"DEBUG: current_state board = {self.current_state.board}, to_move = {self.current_state.to_move}, moves = {self.current_state.moves}")
-            suggestions_text = ""
-            if self.claude_available:
-                try:
-                    claude_suggestion = self.game.get_claude_suggestion(self.current_state)
-                    suggestions_text += "Claude's Suggestion:\n"
-                    suggestions_text += f"Move: {claude_suggestion[0]}\n"
-                    suggestions_text += f"Explanation: {claude_suggestion[1]}\n\n"
-                except Exception as e:
-                    suggestions_text += "Claude's Suggestion:\n"
-                    suggestions_text += f"Error: {str(e)}\n\n"
-            eval_suggestion = self.game.get_eval_suggestion(self.current_state)
-            suggestions_text += "Evaluation Function Suggestion:\n"
+            state = self.current_state
+            claude_available = self.game.claude_available
+            if claude_available:
+                # Claude answers, shown as it arrives, while the evaluation function searches
+                def claude_text():
+                    for kind, text in self.game.stream_claude_suggestion(state):
+                        yield f"Move: {text}\nExplanation: " if kind == "move" else text
+                self.stream_suggestions(claude_text)
+            stats = SearchStats()
+            eval_suggestion = self.game.get_eval_suggestion(state, stats=stats)
+            suggestions_text = "Evaluation Function Suggestion:\n"
             suggestions_text += f"Move: {eval_suggestion[0]}\n"
-            suggestions_text += f"Explanation: {eval_suggestion[1]}"
-            self.suggestions_text.config(state=tk.NORMAL)
-            self.suggestions_text.delete(1.0, tk.END)
-            self.suggestions_text.insert(tk.END, suggestions_text)
-            self.suggestions_text.config(state=tk.DISABLED)
+            suggestions_text += f"Explanation: {eval_suggestion[1]}\n"
+            suggestions_text += f"Search: {stats}\n\n"
+            suggestions_text += "Claude's Suggestion:\n"
+            if claude_available is None:
+                suggestions_text += "Still connecting to Claude, try again shortly.\n"
+            elif not claude_available:
+                suggestions_text += "Claude API is not available.\n"
+            self.set_suggestions(suggestions_text)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to get suggestions: {str(e)}")
 
     def compare_moves(self):
         try:
-            if not self.claude_available:
+            if self.game.claude_available is None:
+                messagebox.showinfo("Info", "Still connecting to Claude, try again shortly.")
+                return
+            if not self.game.claude_available:
                 messagebox.showwarning("Warning", "Claude API is not available. Cannot compare moves.")
                 return
-                
-            # Get both suggestions
-            claude_suggestion = self.game.get_claude_suggestion(self.current_state)
-            eval_suggestion = self.game.get_eval_suggestion(self.current_state)
-            
-            # Get game state for comparison
-            game_state = {
-                "board": self.current_state.board,
-                "to_move": self.current_state.to_move,
-                "moves": self.current_state.moves
-            }
-            
-            # Get comparison from Claude
-            comparison = self.game.claude.compare_moves(game_state, claude_suggestion[0], eval_suggestion[0])
-            
-            # Display comparison
-            self.suggestions_text.config(state=tk.NORMAL)
-            self.suggestions_text.delete(1.0, tk.END)
-            self.suggestions_text.insert(tk.END, "Move Comparison:\n\n")
-            self.suggestions_text.insert(tk.END, comparison)
-            self.suggestions_text.config(state=tk.DISABLED)
+
+            state = self.current_state
+            def comparison_text():
+                # Get both suggestions at the same time, then stream Claude's comparison
+                claude_suggestion, eval_suggestion = self.game.get_suggestions(state)
+                yield from self.game.stream_comparison(state, claude_suggestion[0], eval_suggestion[0])
+            self.stream_suggestions(comparison_text)
+            self.set_suggestions("Move Comparison:\n\n")
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to compare moves: {str(e)}")
 
+    def set_suggestions(self, text):
+        self.suggestions_text.config(state=tk.NORMAL)
+        self.suggestions_text.delete(1.0, tk.END)
+        self.suggestions_text.insert(tk.END, text)
+        self.suggestions_text.config(state=tk.DISABLED)
+
+    def append_suggestions(self, text):
+        self.suggestions_text.config(state=tk.NORMAL)
+        self.suggestions_text.insert(tk.END, text)
+        self.suggestions_text.see(tk.END)
+        self.suggestions_text.config(state=tk.DISABLED)
+
+    def stream_suggestions(self, produce):
+        """Append the pieces of text yielded by produce() to the suggestions
+        box as they come. produce() runs in a thread, so the window stays
+        responsive; the pieces reach Tk through a queue polled with
+        root.after. Starting another stream, or a new game, drops this one."""
+        self.stream_id += 1
+        stream_id = self.stream_id
+        pieces = queue.Queue()
+
+        def work():
+            try:
+                for text in produce():
+                    pieces.put(text)
+            except Exception as e:
+                pieces.put(f"\nError: {str(e)}\n")
+            pieces.put(None)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.root.after(50, self.poll_stream, pieces, stream_id)
+
+    def poll_stream(self, pieces, stream_id):
+        if stream_id != self.stream_id:
+            return
+        try:
+            while True:
+                text = pieces.get_nowait()
+                if text is None:
+                    return
+                self.append_suggestions(text)
+        except queue.Empty:
+            self.root.after(50, self.poll_stream, pieces, stream_id)
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = NimGUI(root)
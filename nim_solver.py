@@ -0,0 +1,87 @@
+"""Closed-form play for Nim [Bouton 1901].
+
+A position is a sequence of pile sizes. Under normal play (the player who
+takes the last object wins) the player to move loses exactly when the nim
+sum, the XOR of the piles, is 0, and otherwise wins by moving to a nim sum
+of 0. Under misere play (the player who takes the last object loses) the
+same holds until only one pile has more than one object left; from then
+on, the winner leaves an odd number of single-object piles. Either way a
+move is found in one pass over the piles.
+
+Reordering the piles or adding empty ones does not change a position, so
+caches key positions on canonical(board), and moves are translated back
+to the rows of the board they are reported for."""
+
+from functools import reduce
+from operator import xor
+
+
+def nim_sum(board):
+    """The XOR of the pile sizes."""
+    return reduce(xor, board, 0)
+
+
+def is_winning(board, misere=False):
+    """Whether the player to move can force a win from board."""
+    if misere and all(pile <= 1 for pile in board):
+        # Single objects only: the players alternate until one takes the last
+        return sum(board) % 2 == 0
+    return nim_sum(board) != 0
+
+
+def winning_move(board, misere=False):
+    """Return a winning move (row, number of objects) for the player to
+    move, or None if every move loses against best play."""
+    s = nim_sum(board)
+    if misere:
+        big = [i for i, pile in enumerate(board) if pile > 1]
+        if not big:
+            ones = [i for i, pile in enumerate(board) if pile == 1]
+            return (ones[0], 1) if ones and len(ones) % 2 == 0 else None
+        if len(big) == 1:
+            # Take the big pile down to 0 or 1, leaving an odd number of 1s
+            i = big[0]
+            ones = sum(1 for pile in board if pile == 1)
+            return (i, board[i]) if ones % 2 else (i, board[i] - 1)
+    if s == 0:
+        return None
+    for i, pile in enumerate(board):
+        target = pile ^ s
+        if target < pile:
+            return (i, pile - target)
+
+
+def best_move(board, misere=False):
+    """Return a winning move if there is one, else the move that leaves the
+    most objects on the board, giving the opponent the most room to go
+    wrong. None if the board is empty."""
+    move = winning_move(board, misere)
+    if move is None and any(board):
+        i = max(range(len(board)), key=lambda i: board[i])
+        move = (i, 1)
+    return move
+
+
+def canonical(board):
+    """Return (piles, rows): the non-empty piles of board in increasing
+    order, which is the same for every board that is a permutation of it
+    or differs from it only by empty piles, and the row of board each
+    pile came from, for translating moves with to_canonical and
+    from_canonical."""
+    rows = tuple(sorted((i for i, pile in enumerate(board) if pile), key=board.__getitem__))
+    return tuple(board[i] for i in rows), rows
+
+
+def canonical_key(board):
+    """The piles of canonical(board), without the row mapping."""
+    return tuple(sorted(pile for pile in board if pile))
+
+
+def to_canonical(move, rows):
+    """Translate a move on the original board to the canonical piles."""
+    return rows.index(move[0]), move[1]
+
+
+def from_canonical(move, rows):
+    """Translate a move on the canonical piles to the original board."""
+    return rows[move[0]], move[1]
@@ -0,0 +1,326 @@
+"""Variants of the Game of Nim, built on GameOfNim.
+
+A GrundyNim is played like Nim, a move taking objects from one pile, but
+only the numbers of objects its takes() method allows. Such a game is a
+sum of one-pile games, so by the Sprague-Grundy theorem the player to
+move loses (in normal play) exactly when the XOR of the Grundy values of
+the piles is 0. The Grundy values are computed once for every pile size
+up to max_pile, kept in a NumPy array and cached on disk, so choosing a
+move takes table lookups and XORs instead of a tree search.
+
+MooreNim lets a move take from up to k piles at once [Moore 1910]. It
+is not a sum of one-pile games, but it has a closed form of its own."""
+
+import itertools
+import os
+
+import numpy as np
+
+from game_of_nim import GameOfNim, NimState
+from nim_solver import from_canonical, to_canonical
+
+# Where Grundy tables are cached between runs; None turns the cache off
+GRUNDY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'game_of_nim')
+
+
+def mex(values):
+    """The minimum excludant: the least natural number not in values."""
+    values = set(values)
+    n = 0
+    while n in values:
+        n += 1
+    return n
+
+
+def grundy_table(name, size, compute, cache_dir=GRUNDY_CACHE_DIR):
+    """Return the Grundy values for pile sizes 0..size of the one-pile
+    game called name, as computed by compute(size), reading and writing
+    the cache file for name in cache_dir. A cached table for a larger size
+    is reused."""
+    if cache_dir is None:
+        return compute(size)
+    path = os.path.join(cache_dir, 'grundy-{}.npy'.format(name))
+    try:
+        table = np.load(path)
+        if len(table) > size:
+            return table[:size + 1]
+    except (OSError, ValueError):
+        pass
+    table = compute(size)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'wb') as f:
+            np.save(f, table)
+        os.replace(temp, path)
+    except OSError as e:
+        print(f"Could not cache Grundy table {name}: {str(e)}")
+    return table
+
+
+class GrundyNim(GameOfNim):
+    """Nim where a move takes any number of objects from one pile that
+    takes(pile) allows, solved from a table of Grundy values for piles of
+    up to max_pile objects. Subclasses define takes() and a name for the
+    cache file. Positions with a bigger pile, and misere play, to which the
+    Grundy values do not apply, are left to the alpha-beta search."""
+
+    name = None
+
+    def __init__(self, board=[3,1], use_claude=True, misere=False, max_pile=None,
+                 cache_dir=GRUNDY_CACHE_DIR):
+        self.max_pile = max(list(board) + [100]) if max_pile is None else max_pile
+        self.grundy = grundy_table(self.name, self.max_pile, self.compute_grundy,
+                                   cache_dir if self.name else None)
+        super().__init__(board, use_claude, misere)
+        if self.initial.total and self.terminal_test(self.initial):
+            self.initial = self.initial._replace(
+                utility=self.compute_utility(self.initial.board, self.initial.to_move))
+
+    def takes(self, pile):
+        """The numbers of objects a move may take from a pile of that size."""
+        raise NotImplementedError
+
+    def can_move(self, board):
+        """Whether some pile of board has a legal take."""
+        return any(self.takes(pile) for pile in board if pile)
+
+    def result(self, state, move):
+        state = super().result(state, move)
+        if state.total and not self.can_move(state.board):
+            state = state._replace(utility=self.compute_utility(state.board, state.to_move))
+        return state
+
+    def terminal_test(self, state):
+        """A state is terminal if no pile has a legal take, which may
+        happen with objects left when takes() does not allow 1."""
+        return state.total == 0 or not self.can_move(state.board)
+
+    def compute_utility(self, board, player):
+        """Compute the utility of a board for COMP. player is the one to
+        move next, so if no take is left the other player made the last
+        move and won (or, in misere play, lost)."""
+        if self.can_move(board):
+            return 0
+        if self.misere:
+            return 1 if player == 'COMP' else -1
+        return -1 if player == 'COMP' else 1
+
+    def compute_grundy(self, size):
+        """The Grundy values of pile sizes 0..size, by the mex rule."""
+        table = np.zeros(size + 1, dtype=np.int64)
+        for n in range(1, size + 1):
+            table[n] = mex(table[n - y] for y in self.takes(n))
+        return table
+
+    def actions(self, state):
+        for x, pile in enumerate(state.board):
+            for y in self.takes(pile):
+                yield x, y
+
+    def is_legal(self, state, move):
+        try:
+            x, y = move
+        except (TypeError, ValueError):
+            return False
+        return (isinstance(x, int) and isinstance(y, int) and 0 <= x < len(state.board)
+                and y in self.takes(state.board[x]))
+
+    def describe_rules(self):
+        last = "loses" if self.misere else "wins"
+        return (f"A move takes {self.describe_takes()} objects from one row. "
+                f"The player who makes the last move {last}, even if objects are left.")
+
+    def describe_takes(self):
+        """How many objects takes() allows, for describe_rules."""
+        return "an allowed number of"
+
+    def listed_moves(self, state):
+        return list(self.actions(state))
+
+    def nim_value(self, board):
+        """The XOR of the Grundy values of the piles, or None if a pile is
+        bigger than max_pile."""
+        if max(board, default=0) > self.max_pile:
+            return None
+        return int(np.bitwise_xor.reduce(self.grundy[np.asarray(board, dtype=np.int64)]))
+
+    def solve(self, state):
+        """Move to a position whose Grundy values XOR to 0, or if there is
+        none, take as little as possible from the biggest pile."""
+        board = np.asarray(state.board, dtype=np.int64)
+        if self.misere or not len(board) or board.max() > self.max_pile:
+            return None
+        values = self.grundy[board]
+        targets = values ^ np.bitwise_xor.reduce(values)
+        rows = np.flatnonzero(targets < values)
+        if len(rows):
+            # A pile has moves to every Grundy value below its own
+            x = int(rows[0])
+            pile = state.board[x]
+            return next((x, y) for y in self.takes(pile) if self.grundy[pile - y] == targets[x])
+        for x in np.argsort(-board, kind='stable'):
+            takes = self.takes(state.board[x])
+            if takes:
+                return int(x), min(takes)
+        return None
+
+    def order_actions(self, state, actions):
+        """Try moves to a Grundy value of 0 first, then larger takes."""
+        value = self.nim_value(state.board)
+        if value is None:
+            return sorted(actions, key=lambda m: -m[1])
+        board, grundy = state.board, self.grundy
+        return sorted(actions, key=lambda m: (grundy[board[m[0]] - m[1]] != grundy[board[m[0]]] ^ value,
+                                              -m[1]))
+
+
+class SubtractionNim(GrundyNim):
+    """A subtraction game: a move takes s objects from one pile, for some
+    s in subtraction_set; with subtraction_set=range(1, k + 1), up to k
+    objects. The Grundy values of a subtraction game repeat with some
+    period, so only the values up to the first repeat are computed."""
+
+    def __init__(self, board=[3,1], subtraction_set=(1, 2, 3), use_claude=True, misere=False,
+                 max_pile=None, cache_dir=GRUNDY_CACHE_DIR):
+        self.subtraction_set = tuple(sorted(set(subtraction_set)))
+        self.name = 'subtraction-' + '-'.join(map(str, self.subtraction_set))
+        super().__init__(board, use_claude, misere, max_pile, cache_dir)
+
+    def takes(self, pile):
+        return [s for s in self.subtraction_set if s <= pile]
+
+    def describe_takes(self):
+        *rest, last = self.subtraction_set
+        return f"{', '.join(map(str, rest))} or {last}" if rest else str(last)
+
+    def compute_grundy(self, size):
+        # The values for the last max(subtraction_set) sizes determine the
+        # rest, so once such a window repeats the sequence is periodic.
+        window = self.subtraction_set[-1]
+        table = np.zeros(size + 1, dtype=np.int64)
+        seen = {}
+        for n in range(1, size + 1):
+            table[n] = mex(table[n - s] for s in self.subtraction_set if s <= n)
+            if n >= window:
+                key = table[n - window + 1:n + 1].tobytes()
+                if key in seen:
+                    start = seen[key] + 1
+                    period = n + 1 - start
+                    rest = np.arange(n + 1, size + 1)
+                    table[n + 1:] = table[start + (rest - start) % period]
+                    break
+                seen[key] = n
+        return table
+
+
+class MooreNim(GameOfNim):
+    """Moore's Nim-k: a move takes objects from at least one and at most k
+    piles, any number from each [Moore 1910]. Moves are tuples of (row,
+    number of objects) pairs, one per pile; result also takes a single
+    (row, number of objects) pair. The player to move loses (in normal
+    play) exactly when, for every bit, the number of piles with that bit
+    set is a multiple of k + 1; solve() moves to such a position one bit
+    at a time. Misere play is left to the alpha-beta search."""
+
+    move_format = "((row, number_of_objects), ...)"
+
+    def __init__(self, board=[3,1], k=2, use_claude=True, misere=False):
+        self.k = k
+        self.name = 'moore-{}'.format(k)
+        super().__init__(board, use_claude, misere)
+
+    def actions(self, state):
+        rows = [x for x, pile in enumerate(state.board) if pile]
+        for r in range(1, self.k + 1):
+            for chosen in itertools.combinations(rows, r):
+                for takes in itertools.product(*(range(1, state.board[x] + 1) for x in chosen)):
+                    yield tuple(zip(chosen, takes))
+
+    def is_legal(self, state, move):
+        """A move is legal if it takes from 1 to k different rows, each
+        as a legal Nim move."""
+        try:
+            if isinstance(move[0], int):
+                move = (move,)
+            rows = set(x for x, _ in move)
+        except (TypeError, ValueError, IndexError, KeyError):
+            return False
+        return (1 <= len(move) <= self.k and len(rows) == len(move)
+                and all(super(MooreNim, self).is_legal(state, m) for m in move))
+
+    def describe_rules(self):
+        last = "loses" if self.misere else "wins"
+        return (f"A move takes any number of objects from each of 1 to {self.k} rows, "
+                f"written as {self.move_format}; (row, number_of_objects) takes from one row. "
+                f"The player who takes the last object {last}.")
+
+    def result(self, state, move):
+        if isinstance(move[0], int):
+            move = (move,)
+        board = list(state.board)
+        for x, y in move:
+            board[x] -= y
+        board = tuple(board)
+        total = state.total - sum(y for _, y in move)
+        next = 'P1' if state.to_move == 'COMP' else 'COMP'
+        utility = self.compute_utility(board, next) if total == 0 else 0
+        return NimState(to_move=next, utility=utility, board=board, total=total)
+
+    def nim_value(self, board):
+        """For each bit, from the lowest, the number of piles with the bit
+        set modulo k + 1, as the digits of a number in base k + 1: 0
+        exactly when the player to move loses (in normal play)."""
+        value, scale = 0, 1
+        for bit in range(max(board, default=0).bit_length()):
+            value += scale * (sum(pile >> bit & 1 for pile in board) % (self.k + 1))
+            scale *= self.k + 1
+        return value
+
+    def solve(self, state):
+        if self.misere:
+            return None
+        board = state.board
+        new = {}
+        for bit in reversed(range(max(board, default=0).bit_length())):
+            mask = 1 << bit
+            ones = [x for x, pile in enumerate(board) if x not in new and pile & mask]
+            r = len(ones) % (self.k + 1)
+            if not r:
+                continue
+            if len(new) >= self.k + 1 - r:
+                # Set this bit in enough of the piles already being reduced
+                for x in list(new)[:self.k + 1 - r]:
+                    new[x] |= mask
+            else:
+                # Clear it in r more piles, reducing them; their lower bits are free
+                for x in ones[:r]:
+                    new[x] = board[x] >> (bit + 1) << (bit + 1)
+        if not new:
+            x = max(range(len(board)), key=lambda x: board[x], default=None)
+            return None if x is None or not board[x] else ((x, 1),)
+        return tuple((x, board[x] - new[x]) for x in sorted(new))
+
+    def order_actions(self, state, actions):
+        return sorted(actions, key=lambda m: -sum(y for _, y in m))
+
+    def to_canonical(self, move, rows):
+        if isinstance(move[0], int):
+            move = (move,)
+        return tuple(to_canonical(m, rows) for m in move)
+
+    def from_canonical(self, move, rows):
+        return tuple(from_canonical(m, rows) for m in move)
+
+    def describe_move(self, move):
+        if isinstance(move[0], int):
+            move = (move,)
+        return ' and '.join(f"taking {y} objects from row {x}" for x, y in move).capitalize()
+
+
+# The variants by name, for command line tools
+VARIANTS = {
+    'nim': GameOfNim,
+    'subtraction': SubtractionNim,
+    'moore': MooreNim,
+}
@@ -0,0 +1,207 @@
+"""Opening books for the Game of Nim: the moves for every position within
+a few moves of some starting boards, solved ahead of time and stored in
+a file.
+
+    python opening_book.py --boards 3,4,5 1,3,5,7 --depth 8
+    python opening_book.py --variant subtraction --subtraction-set 1,3,4 --misere
+
+Positions are stored by their canonical piles, so one entry serves every
+board that is a permutation of it or differs from it only by empty
+piles, and the side to move does not matter, Nim being impartial. The
+file is a hash table with open addressing and fixed-size slots, read
+through mmap: a lookup hashes the piles and reads a slot or two, however
+big the book, and opening a book reads nothing but its header.
+
+Attach a book to a game with game.book = OpeningBook(path); book_move
+then answers from it, and alpha_beta_player and get_eval_suggestion fall
+back to solving or searching on a miss."""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+
+from games import MoveOrdering, alpha_beta_search
+from nim_solver import canonical_key
+from nim_variants import GRUNDY_CACHE_DIR, VARIANTS
+
+# Where load_book looks for a book by default
+DEFAULT_BOOK = os.path.join(GRUNDY_CACHE_DIR, 'opening-book.bin') if GRUNDY_CACHE_DIR else None
+
+MAGIC = b'NIMBOOK2'
+# magic, length of the rules name that follows the header, number of slots,
+# number of entries. The name, in UTF-8, is stored in full after the header,
+# followed by the slots.
+HEADER = struct.Struct('<8sIQQ')
+# hash of the canonical piles (0 for an empty slot), pile index, objects to take
+SLOT = struct.Struct('<QII')
+
+
+def position_hash(piles):
+    """A 64-bit hash of canonical piles, the same on every platform and
+    never 0."""
+    digest = hashlib.blake2b(struct.pack('<{}Q'.format(len(piles)), *piles), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little') or 1
+
+
+class OpeningBook:
+    """An opening book file, memory-mapped for reading."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length, self.capacity, self.count = (HEADER.unpack_from(self._map)
+                                                    if len(self._map) >= HEADER.size
+                                                    else (None, 0, 0, 0))
+        self._slots = HEADER.size + length
+        if magic != MAGIC or self._slots + self.capacity * SLOT.size > len(self._map):
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.rules = self._map[HEADER.size:self._slots].decode()
+
+    def lookup(self, piles):
+        """Return the move (index into piles, number of objects) stored for
+        the canonical piles, or None."""
+        key = position_hash(piles)
+        mask = self.capacity - 1
+        i = key & mask
+        while True:
+            stored, x, y = SLOT.unpack_from(self._map, self._slots + i * SLOT.size)
+            if stored == key:
+                return x, y
+            if not stored:
+                return None
+            i = (i + 1) & mask
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"OpeningBook({self.path!r})"
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # An mmap cannot be pickled; a copy opens the file again
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+
+def load_book(path=DEFAULT_BOOK):
+    """Return the OpeningBook at path, or None if there is none to read."""
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not read opening book {path}: {str(e)}")
+        return None
+
+
+def solve_position(game, state):
+    """The move game plays at state: the closed form where it has one,
+    else the full alpha-beta search."""
+    move = game.solve(state)
+    if move is None:
+        move = alpha_beta_search(state, game, tt=game.transposition_table,
+                                 ordering=MoveOrdering())
+    return move
+
+
+def build_book(game, roots, depth=8):
+    """Return {canonical piles: move} for every position of game within
+    depth moves of one of the boards in roots that is not over yet. Moves
+    are on the canonical piles; those that take from more than one pile
+    are left out."""
+    book = {}
+    seen = set()
+    frontier = {canonical_key(root) for root in roots}
+    for ply in range(depth + 1):
+        following = set()
+        for piles in frontier - seen:
+            seen.add(piles)
+            state = game.initial._replace(utility=0, board=piles, total=sum(piles))
+            if game.terminal_test(state):
+                # No move to store, even with objects left in some variants
+                continue
+            move = solve_position(game, state)
+            if len(move) == 1:
+                move = move[0]
+            if isinstance(move[0], int):
+                book[piles] = move
+            if ply < depth:
+                for action in game.actions(state):
+                    following.add(canonical_key(game.result(state, action).board))
+        frontier = following
+    return book
+
+
+def write_book(path, book, rules):
+    """Write book, as returned by build_book, to path as an opening book
+    for the given rules (see GameOfNim.rules)."""
+    capacity = 1 << max(4, (2 * len(book)).bit_length())  # at most half full
+    mask = capacity - 1
+    name = rules.encode()
+    slots = HEADER.size + len(name)
+    data = bytearray(slots + capacity * SLOT.size)
+    HEADER.pack_into(data, 0, MAGIC, len(name), capacity, len(book))
+    data[HEADER.size:slots] = name
+    for piles, (x, y) in book.items():
+        key = position_hash(piles)
+        i = key & mask
+        while SLOT.unpack_from(data, slots + i * SLOT.size)[0]:
+            i = (i + 1) & mask
+        SLOT.pack_into(data, slots + i * SLOT.size, key, x, y)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def parse_board(text):
+    return tuple(int(n) for n in text.split(','))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='nim')
+    parser.add_argument('--boards', nargs='+', type=parse_board,
+                        default=[(3, 4, 5), (1, 3, 5, 7), (0, 5, 3, 1)],
+                        help='comma-separated piles of the starting boards')
+    parser.add_argument('--depth', type=int, default=8,
+                        help='moves from the starting boards to solve')
+    parser.add_argument('--misere', action='store_true',
+                        help='the player who takes the last object loses')
+    parser.add_argument('--subtraction-set', type=parse_board, default=(1, 2, 3),
+                        help='for --variant subtraction, the numbers of objects a move may take')
+    parser.add_argument('--k', type=int, default=2,
+                        help='for --variant moore, the most piles a move may take from')
+    parser.add_argument('--out', default=DEFAULT_BOOK)
+    args = parser.parse_args(argv)
+
+    biggest = max(max(board, default=0) for board in args.boards)
+    options = {'subtraction': {'subtraction_set': args.subtraction_set, 'max_pile': biggest},
+               'moore': {'k': args.k}}.get(args.variant, {})
+    game = VARIANTS[args.variant](board=list(args.boards[0]), use_claude=False,
+                                  misere=args.misere, **options)
+    book = build_book(game, args.boards, args.depth)
+    write_book(args.out, book, game.rules)
+    print(f"Wrote {len(book)} positions for {game.rules} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
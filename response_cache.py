@@ -0,0 +1,97 @@
+"""A persistent cache of Claude's answers, shared by every session and
+process on the machine.
+
+Answers are stored in an SQLite database under a key made from the model,
+the version of the prompt and the question asked, so a prompt change
+(with its version bumped) or a model change never gets an old answer.
+Entries older than ttl seconds are dropped when read, and beyond
+max_entries the least recently used ones are evicted."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Where ClaudeHelper caches answers by default; None turns the cache off
+RESPONSE_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'game_of_nim',
+                                   'claude-responses.sqlite3')
+
+
+class ResponseCache:
+    """Answers to questions, by key, in the SQLite database at path. The
+    hits and misses counters of this instance give the hit rate."""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=30 * 24 * 3600, max_entries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                        "created REAL NOT NULL, accessed REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def key(*parts, default=None):
+        """A key for a question made of JSON-serializable parts, the same
+        for equal parts however dicts in them are ordered."""
+        text = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=default)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the answer stored under key, or None."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, created FROM responses WHERE key = ?",
+                                  (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store value, anything JSON can hold, under key."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                            (key, json.dumps(value), now, now))
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.db.execute("DELETE FROM responses WHERE key IN "
+                                "(SELECT key FROM responses ORDER BY accessed LIMIT ?)", (excess,))
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """The counters of this instance and the size of the cache, as a dict."""
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+                'entries': len(self)}
+
+    def close(self):
+        self.db.close()
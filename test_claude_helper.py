@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+import claude_helper
+from claude_helper import ClaudeHelper, _parse_suggestion_stream
+from mock_claude_server import MockClaudeServer
+
+REPLY = "Move: (1, 2)\nExplanation: This leaves a nim sum of 0.\nThe nim sum is 0."
+
+
+def parse(chunks):
+    events = list(_parse_suggestion_stream(chunks))
+    moves = [text for kind, text in events if kind == "move"]
+    explanation = ''.join(text for kind, text in events if kind == "explanation")
+    return moves, explanation
+
+
+@pytest.mark.parametrize('size', [1, 2, 5, 13, len(REPLY)])
+def test_parse_suggestion_stream_in_any_chunks(size):
+    chunks = [REPLY[i:i + size] for i in range(0, len(REPLY), size)]
+    assert parse(chunks) == (["(1, 2)"], "This leaves a nim sum of 0.\nThe nim sum is 0.")
+
+
+def test_parse_suggestion_stream_yields_move_before_explanation():
+    events = _parse_suggestion_stream(iter(["Move: (0, 3)\n", "Explanation: ", "Because"]))
+    assert next(events) == ("move", "(0, 3)")
+    assert list(events) == [("explanation", "Because")]
+
+
+def test_parse_suggestion_stream_without_explanation():
+    assert parse(["Move: (2, 1)"]) == (["(2, 1)"], "")
+    assert parse(["Explanation: no move given"]) == ([], "")
+
+
+def test_parse_suggestion_matches_the_stream():
+    claude = ClaudeHelper(cache_path=None, api_key='sk-ant-api-mock')
+    reply = REPLY + "\nNote: the other rows: all even."
+    assert claude._parse_suggestion(reply) == ("(1, 2)", parse([reply])[1])
+
+
+@pytest.fixture
+def server():
+    server = MockClaudeServer(('127.0.0.1', 0), 0.0, 0.0, 0.0, 'engine', 0.0, None, 0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_async_client_shared_between_event_loops(server):
+    claude = ClaudeHelper(cache_path=None, api_key='sk-ant-api-mock', base_url=server.url)
+
+    async def ask(board):
+        client = claude.async_client
+        return client, await claude.get_suggestions_async({"board": board, "to_move": "P1"})
+
+    first, (move, _) = asyncio.run(ask([3, 4, 5]))
+    second, _ = asyncio.run(ask([1, 2, 3]))
+    assert first is second
+    assert move == "(0, 2)"
+    claude_helper.close_async_clients()
+    assert claude.async_client is not first
@@ -0,0 +1,23 @@
+from game_of_nim import GameOfNim
+from games import SearchStats
+from nim_variants import SubtractionNim
+
+
+def test_eval_suggestion_counts_one_search():
+    solved = GameOfNim([3, 4, 5], use_claude=False)
+    searched = SubtractionNim([3, 4], use_claude=False, misere=True, cache_dir=None)
+    for game in (solved, searched):
+        stats = SearchStats()
+        game.get_eval_suggestion(game.initial, stats)
+        assert stats.searches == 1
+        assert stats.branching_factor >= 0
+        # Answered from the suggestion cache the second time
+        game.get_eval_suggestion(game.initial, stats)
+        assert stats.searches == 2
+
+
+def test_suggestions_without_claude():
+    game = GameOfNim([3, 4, 5], use_claude=False)
+    claude_suggestion, eval_suggestion = game.get_suggestions(game.initial)
+    assert claude_suggestion[1] == "Claude API is not available"
+    assert eval(eval_suggestion[0]) == (0, 2)
@@ -0,0 +1,149 @@
+import pytest
+
+from games import *
+
+
+def tictactoe_midgame():
+    game = TicTacToe()
+    state = game.result(game.initial, (1, 1))
+    return game, game.result(state, (1, 2))
+
+
+def minimax_value(game, state, player):
+    """The value of state for player by plain recursive minimax."""
+    if game.terminal_test(state):
+        return game.utility(state, player)
+    values = [minimax_value(game, game.result(state, a), player) for a in game.actions(state)]
+    return max(values) if game.to_move(state) == player else min(values)
+
+
+def positions():
+    fig52 = Fig52Game()
+    yield fig52, fig52.initial
+    for move in fig52.actions(fig52.initial):
+        yield fig52, fig52.result(fig52.initial, move)
+    game, state = tictactoe_midgame()
+    yield game, state
+    for moves in [[(1, 1), (1, 2), (1, 3)], [(2, 2), (1, 1), (3, 3), (1, 3)],
+                  [(1, 1), (2, 2), (3, 3), (1, 2)]]:
+        state = game.initial
+        for move in moves:
+            state = game.result(state, move)
+        yield game, state
+
+
+def assert_best(game, state, move):
+    """Check that move keeps the minimax value of state."""
+    player = game.to_move(state)
+    assert minimax_value(game, game.result(state, move), player) == minimax_value(game, state, player)
+
+
+@pytest.mark.parametrize('ordering', [False, True])
+@pytest.mark.parametrize('tt', [False, True])
+def test_alpha_beta_matches_minimax(tt, ordering):
+    for game, state in positions():
+        assert_best(game, state, alpha_beta_search(state, game,
+                                                   tt=TranspositionTable() if tt else None,
+                                                   ordering=MoveOrdering() if ordering else None))
+
+
+def test_transposition_table_is_reused():
+    game, state = tictactoe_midgame()
+    tt = TranspositionTable()
+    move = alpha_beta_search(state, game, tt=tt)
+    misses = tt.misses
+    assert alpha_beta_search(state, game, tt=tt) == move
+    assert tt.misses == misses
+    assert tt.hits > 0
+
+
+def test_iterative_deepening_matches_minimax():
+    for game, state in positions():
+        assert_best(game, state, iterative_deepening_search(state, game))
+    game, state = tictactoe_midgame()
+    # Out of time before the first iteration ends: still a legal move
+    assert iterative_deepening_search(state, game, node_limit=1) in game.actions(state)
+
+
+@pytest.mark.parametrize('pvs', [False, True])
+@pytest.mark.parametrize('ordering', [False, True])
+@pytest.mark.parametrize('tt', [False, True])
+def test_negamax_matches_minimax(tt, ordering, pvs):
+    for game, state in positions():
+        move, value = negamax_search(state, game, tt=TranspositionTable() if tt else None,
+                                     ordering=MoveOrdering() if ordering else None, pvs=pvs)
+        assert value == minimax_value(game, state, game.to_move(state))
+        assert_best(game, state, move)
+
+
+def test_minmax_decision_matches_minimax():
+    for game, state in positions():
+        assert_best(game, state, minmax_decision(state, game))
+
+
+def test_parallel_alpha_beta_matches_serial():
+    game, state = tictactoe_midgame()
+    stats = SearchStats()
+    assert (parallel_alpha_beta_search(state, game, workers=2, stats=stats)
+            == alpha_beta_search(state, game))
+    assert stats.searches == 1
+
+
+def test_parallel_alpha_beta_player_keeps_its_pool():
+    game, state = tictactoe_midgame()
+    player = ParallelAlphaBetaPlayer(workers=2)
+    try:
+        assert player(game, state) == alpha_beta_search(state, game)
+        pool = player.pool
+        state = game.result(state, (2, 2))
+        assert player(game, state) == alpha_beta_search(state, game)
+        assert player.pool is pool and player.workers == 2
+    finally:
+        player.close()
+
+
+@pytest.mark.parametrize('beta', [-1, 0, 1])
+def test_shared_beta_narrows_like_beta(beta):
+    game, state = tictactoe_midgame()
+    assert (negamax_search(state, game, shared_beta=lambda: beta)[1]
+            == negamax_search(state, game, beta=beta)[1])
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.peek('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert len(cache) == 2
+
+
+def test_pondering_rolls_the_opponents_dice_first():
+    game = Backgammon()
+    state = game.outcome(game.initial, game.chances(game.initial)[0])
+    player = PonderingPlayer(random_player, replies=1)
+    player(game, state)
+    player.thread.join()
+    player.stop()
+    assert player.cache
+    for position, move in player.cache.values():
+        assert position.chance is not None and position.to_move == state.to_move
+
+
+def test_pondering_errors_are_raised_by_stop():
+    def failing_player(game, state):
+        raise ValueError('no move')
+
+    game, state = tictactoe_midgame()
+    player = PonderingPlayer(failing_player)
+    # The move at state itself comes from the cache, so only pondering fails
+    player.cache[game.state_key(state)] = state, (1, 3)
+    player(game, state)
+    player.thread.join()
+    with pytest.raises(ValueError):
+        player.stop()
+    player.stop()
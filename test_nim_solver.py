@@ -0,0 +1,34 @@
+import itertools
+
+import pytest
+
+from game_of_nim import GameOfNim
+from games import negamax_search
+from nim_solver import (best_move, canonical, canonical_key, from_canonical,
+                        is_winning, to_canonical, winning_move)
+
+BOARDS = [board for n in (1, 2, 3) for board in itertools.product(range(5), repeat=n) if any(board)]
+
+
+@pytest.mark.parametrize('misere', [False, True])
+def test_winning_move_matches_search(misere):
+    for board in BOARDS:
+        game = GameOfNim(list(board), use_claude=False, misere=misere)
+        state = game.initial
+        value = negamax_search(state, game)[1]
+        move = winning_move(board, misere)
+        assert is_winning(board, misere) == (value == 1)
+        assert (move is not None) == (value == 1)
+        if move is not None:
+            after = game.result(state, move)
+            assert game.terminal_test(after) or negamax_search(after, game)[1] == -1
+        assert best_move(board, misere) in game.actions(state)
+
+
+def test_canonical_moves_translate_back():
+    board = (0, 5, 3, 0, 1)
+    piles, rows = canonical(board)
+    assert piles == (1, 3, 5)
+    assert canonical_key((3, 0, 1, 5)) == piles
+    for move in [(x, y) for x, pile in enumerate(board) for y in range(1, pile + 1)]:
+        assert from_canonical(to_canonical(move, rows), rows) == move
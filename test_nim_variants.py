@@ -0,0 +1,86 @@
+import pytest
+
+from games import alpha_beta_player, negamax_search, random_player
+from nim_variants import MooreNim, SubtractionNim
+
+
+def test_subtraction_without_one_ends_when_no_take_is_left():
+    game = SubtractionNim([1, 1], subtraction_set=(2, 3), use_claude=False, cache_dir=None)
+    assert game.terminal_test(game.initial)
+    # COMP is to move and cannot, so it has lost
+    assert game.utility(game.initial, 'COMP') == -1
+
+    game = SubtractionNim([1, 4], subtraction_set=(2, 3), use_claude=False, cache_dir=None)
+    state = game.result(game.initial, (1, 3))
+    assert game.terminal_test(state)
+    assert game.utility(state, 'COMP') == 1
+    assert game.get_eval_suggestion(state)[0] == "None"
+
+
+@pytest.mark.parametrize('misere', [False, True])
+def test_subtraction_without_one_plays_to_the_end(misere):
+    game = SubtractionNim([1, 4], subtraction_set=(2, 3), use_claude=False, misere=misere,
+                          cache_dir=None)
+    assert game.play_game(alpha_beta_player, random_player) == 1
+    assert negamax_search(game.initial, game)[1] == 1
+
+
+@pytest.mark.parametrize('subtraction_set', [(1, 2, 3), (1, 3, 4), (1, 4), (2, 3), (2, 5)])
+def test_subtraction_solve_matches_search(subtraction_set):
+    for board in [(1, 4), (3, 5), (2, 6, 7), (4, 4, 1)]:
+        game = SubtractionNim(list(board), subtraction_set=subtraction_set, use_claude=False,
+                              cache_dir=None)
+        state = game.initial
+        if game.terminal_test(state):
+            continue
+        _, value = negamax_search(state, game)
+        move = game.solve(state)
+        # The solver finds a win exactly when there is one, and its move keeps it
+        assert (game.nim_value(state.board) != 0) == (value == 1)
+        after = game.result(state, move)
+        assert negamax_search(after, game)[1] == -value or game.terminal_test(after)
+
+
+@pytest.mark.parametrize('k', [1, 2])
+def test_moore_solve_matches_search(k):
+    for board in [(1, 2), (3, 1, 2), (2, 2, 3), (1, 2, 3)]:
+        game = MooreNim(list(board), k=k, use_claude=False)
+        state = game.initial
+        winning = negamax_search(state, game)[1] == 1
+        assert (game.nim_value(state.board) != 0) == winning
+        if winning:
+            after = game.result(state, game.solve(state))
+            assert game.nim_value(after.board) == 0
+            assert game.terminal_test(after) or negamax_search(after, game)[1] == -1
+
+
+def test_piles_beyond_the_table_are_searched():
+    game = SubtractionNim([60, 3], max_pile=20, use_claude=False, cache_dir=None)
+    assert game.nim_value(game.initial.board) is None
+    move, explanation = game.get_eval_suggestion(game.initial)
+    assert eval(move) in list(game.actions(game.initial))
+    assert "nim sum" not in explanation
+
+
+def test_moves_are_checked_by_the_variant(monkeypatch, capsys):
+    game = SubtractionNim([5, 3], subtraction_set=(1, 2), use_claude=False, cache_dir=None)
+    state = game.initial
+    assert not game.is_legal(state, (0, 5))
+    assert game.is_legal(state, (0, 2))
+    state_for_claude = game.claude_state(state)
+    assert state_for_claude["moves"] == list(game.actions(state))
+    assert "1 or 2 objects" in state_for_claude["rules"]
+    answers = iter(['(0, 5)', '(1, 2)'])
+    monkeypatch.setattr('builtins.input', lambda prompt: next(answers))
+    assert game.get_custom_move(state) == (1, 2)
+    assert "(0, 5) is not a legal move" in capsys.readouterr().out
+
+    game = MooreNim([3, 1, 2], k=2, use_claude=False)
+    state = game.initial
+    assert game.is_legal(state, ((0, 3), (2, 1)))
+    assert game.is_legal(state, (1, 1))
+    assert not game.is_legal(state, ((0, 1), (1, 1), (2, 1)))
+    assert not game.is_legal(state, ((0, 1), (0, 1)))
+    assert not game.is_legal(state, ((0, 4),))
+    monkeypatch.setattr('builtins.input', lambda prompt: '((0, 1), (2, 2))')
+    assert game.get_custom_move(state) == ((0, 1), (2, 2))
@@ -0,0 +1,60 @@
+from game_of_nim import GameOfNim
+from nim_variants import SubtractionNim
+from opening_book import OpeningBook, build_book, load_book, write_book
+
+
+def test_round_trip(tmp_path):
+    game = GameOfNim([3, 4, 5], use_claude=False)
+    book = build_book(game, [(3, 4, 5)], depth=3)
+    path = str(tmp_path / 'book.bin')
+    write_book(path, book, game.rules)
+    with OpeningBook(path) as opened:
+        assert opened.rules == game.rules
+        assert len(opened) == len(book)
+        for piles, move in book.items():
+            assert opened.lookup(piles) == move
+        assert opened.lookup((100, 200, 300)) is None
+
+
+def test_book_answers_for_the_same_rules_only(tmp_path):
+    game = GameOfNim([3, 4, 5], use_claude=False)
+    path = str(tmp_path / 'book.bin')
+    write_book(path, build_book(game, [(3, 4, 5)], depth=1), game.rules)
+    game.book = OpeningBook(path)
+    assert game.book_move(game.initial) is not None
+    misere = GameOfNim([3, 4, 5], use_claude=False, misere=True)
+    misere.book = game.book
+    assert misere.book_move(misere.initial) is None
+    game.book.close()
+
+
+def test_long_rules_name_is_kept_whole(tmp_path):
+    game = SubtractionNim([3, 5], subtraction_set=range(1, 11), use_claude=False, misere=True,
+                          cache_dir=None)
+    assert len(game.rules) > 32
+    path = str(tmp_path / 'book.bin')
+    write_book(path, build_book(game, [(3, 5)], depth=2), game.rules)
+    game.book = OpeningBook(path)
+    assert game.book.rules == game.rules
+    assert game.book_move(game.initial) is not None
+    game.book.close()
+
+
+def test_load_book_rejects_other_files(tmp_path):
+    path = tmp_path / 'not-a-book.bin'
+    # Written by an earlier version, with the rules cut to 32 bytes
+    path.write_bytes(b'NIMBOOK1' + bytes(64))
+    assert load_book(str(path)) is None
+    assert load_book(str(tmp_path / 'missing.bin')) is None
+
+
+def test_build_book_skips_positions_without_a_move(tmp_path):
+    game = SubtractionNim([1, 4], subtraction_set=(2, 3), use_claude=False, cache_dir=None)
+    book = build_book(game, [(1, 4)], depth=4)
+    assert (1, 1) not in book and (1,) not in book
+    assert book[(1, 4)] in [(1, 2), (1, 3)]
+    path = str(tmp_path / 'book.bin')
+    write_book(path, book, game.rules)
+    game.book = OpeningBook(path)
+    assert game.book_move(game.initial) is not None
+    game.book.close()
@@ -0,0 +1,62 @@
+import itertools
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that moves on by a second each time it is read; add to
+    clock['time'] to jump ahead."""
+    now = {'time': 1000.0}
+    ticks = itertools.count()
+
+    def time():
+        return now['time'] + next(ticks)
+
+    monkeypatch.setattr(response_cache.time, 'time', time)
+    return now
+
+
+def test_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    key = ResponseCache.key('model', 1, {'b': 2, 'a': 1})
+    assert key == ResponseCache.key('model', 1, {'a': 1, 'b': 2})
+    assert cache.get(key) is None
+    cache.put(key, ['(0, 1)', 'because'])
+    assert cache.get(key) == ['(0, 1)', 'because']
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_entries_expire(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), ttl=60)
+    cache.put('old', 'answer')
+    assert cache.get('old') == 'answer'
+    clock['time'] += 3600
+    assert cache.get('old') is None
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_least_recently_used_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    cache.close()
+
+
+def test_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    first, second = ResponseCache(path), ResponseCache(path)
+    first.put('key', {'move': '(1, 2)'})
+    assert second.get('key') == {'move': '(1, 2)'}
+    first.close()
+    second.close()
@@ -0,0 +1,264 @@
+"""Round-robin tournaments between game players, over a process pool.
+
+Every pair of players meets on every board, each taking the first move
+in half of the games. Results are written to a JSONL file as the games
+finish, one line per game, and a table of win rates, Elo ratings and
+per-move latency percentiles is printed at the end:
+
+    python tournament.py --game nim --boards 3,4,5 1,3,5,7 \\
+        --players alpha_beta nim_solver random --games 100 --out results.jsonl
+
+Players are named from PLAYERS, or given as module:attribute for a player
+function (or a class whose instances are players) defined elsewhere."""
+
+import argparse
+import importlib
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from games import (ConnectFour, MCTSPlayer, TicTacToe, alpha_beta_cutoff_search,
+                   alpha_beta_player, iterative_deepening_search, minmax_player,
+                   random_player)
+from game_of_nim import GameOfNim
+
+
+def nim_solver_player(game, state):
+    """Play the closed-form move where the game has one, else search."""
+    solve = getattr(game, 'solve', None)
+    move = solve(state) if solve is not None else None
+    return move if move is not None else alpha_beta_player(game, state)
+
+
+# Factories for the players known by name; each game gets a fresh player
+PLAYERS = {
+    'random': lambda: random_player,
+    'alpha_beta': lambda: alpha_beta_player,
+    'alpha_beta_cutoff': lambda: lambda game, state: alpha_beta_cutoff_search(state, game, d=4),
+    'iterative_deepening': lambda: lambda game, state: iterative_deepening_search(
+        state, game, time_limit=0.1, tt=game.transposition_table),
+    'minmax': lambda: minmax_player,
+    'mcts': lambda: MCTSPlayer(iterations=200),
+    'nim_solver': lambda: nim_solver_player,
+}
+
+# Default boards: piles for Nim, (h, v, k) for the k-in-a-row games
+GAMES = {
+    'nim': (lambda board: GameOfNim(board=list(board), use_claude=False), [(3, 4, 5)]),
+    'tictactoe': (lambda board: TicTacToe(*board), [(3, 3, 3)]),
+    'connectfour': (lambda board: ConnectFour(*board), [(7, 6, 4)]),
+}
+
+
+def make_player(name):
+    """Return a new player for a name from PLAYERS or a module:attribute."""
+    if name in PLAYERS:
+        return PLAYERS[name]()
+    module, _, attr = name.partition(':')
+    if not attr:
+        raise ValueError(f"Unknown player {name!r}; use one of {sorted(PLAYERS)} or module:attribute")
+    player = getattr(importlib.import_module(module), attr)
+    return player() if isinstance(player, type) else player
+
+
+# Games made in this worker process, by game name and board
+_games = {}
+
+
+def play_match(game_name, board, names, seed):
+    """Play one game between the players named by names, the first one
+    moving first, and return its record."""
+    key = (game_name, board)
+    if key not in _games:
+        _games[key] = GAMES[game_name][0](board)
+    game = _games[key]
+    if game.transposition_table is not None:
+        game.transposition_table.clear()
+    random.seed(seed)
+    players = [make_player(name) for name in names]
+    move_times = [[], []]
+    state = game.initial
+    start = time.perf_counter()
+    try:
+        for turn in itertools.count():
+            if game.terminal_test(state):
+                break
+            clock = time.perf_counter()
+            move = players[turn % 2](game, state)
+            move_times[turn % 2].append(time.perf_counter() - clock)
+            state = game.result(state, move)
+    finally:
+        for player in players:
+            if hasattr(player, 'close'):
+                player.close()
+    result = game.utility(state, game.to_move(game.initial))
+    return {
+        'game': game_name,
+        'board': list(board),
+        'first': names[0],
+        'second': names[1],
+        'result': int(np.sign(result)),
+        'winner': names[0] if result > 0 else names[1] if result < 0 else None,
+        'moves': turn,
+        'elapsed': time.perf_counter() - start,
+        'move_times': move_times,
+        'seed': seed,
+    }
+
+
+def schedule(players, boards, games, self_play=False):
+    """Yield (board, (first, second)) for games games per pair of players
+    on each board, alternating who moves first."""
+    pairs = list(itertools.combinations_with_replacement(players, 2) if self_play
+                 else itertools.combinations(players, 2))
+    for board in boards:
+        for a, b in pairs:
+            for i in range(games):
+                yield board, ((a, b) if i % 2 == 0 else (b, a))
+
+
+def elo_ratings(records, players, iterations=200):
+    """Elo ratings fitting all the results at once (the Bradley-Terry
+    model), averaging 1500. A draw counts as half a win to each side, and
+    every pair is credited with one drawn game, so that a player who
+    never loses still gets a finite rating."""
+    wins = defaultdict(float)
+    played = defaultdict(float)
+    for a, b in itertools.combinations(players, 2):
+        wins[a, b] += 0.5
+        wins[b, a] += 0.5
+        played[a, b] += 1
+        played[b, a] += 1
+    for record in records:
+        a, b = record['first'], record['second']
+        if a == b:
+            continue
+        score = (record['result'] + 1) / 2
+        wins[a, b] += score
+        wins[b, a] += 1 - score
+        played[a, b] += 1
+        played[b, a] += 1
+    strength = {p: 1.0 for p in players}
+    for _ in range(iterations):
+        for p in players:
+            won = sum(wins[p, q] for q in players if q != p)
+            expected = sum(played[p, q] / (strength[p] + strength[q])
+                           for q in players if q != p)
+            if expected:
+                strength[p] = won / expected
+        mean = sum(math.log(s) for s in strength.values()) / len(players)
+        strength = {p: s / math.exp(mean) for p, s in strength.items()}
+    return {p: 1500 + 400 * math.log10(s) for p, s in strength.items()}
+
+
+def summarize(records, players, wall_time):
+    """Return a dict of results per player and for the tournament."""
+    table = {}
+    ratings = elo_ratings(records, players)
+    for p in players:
+        won = drawn = lost = 0
+        times = []
+        for r in records:
+            for side, name in enumerate((r['first'], r['second'])):
+                if name != p:
+                    continue
+                score = r['result'] if side == 0 else -r['result']
+                won += score > 0
+                drawn += score == 0
+                lost += score < 0
+                times.extend(r['move_times'][side])
+        games = won + drawn + lost
+        percentiles = np.percentile(times, [50, 90, 99]) * 1000 if times else [0.0] * 3
+        table[p] = {
+            'games': games, 'won': won, 'drawn': drawn, 'lost': lost,
+            'win_rate': won / games if games else 0.0,
+            'elo': ratings[p],
+            'moves': len(times),
+            'p50_ms': percentiles[0], 'p90_ms': percentiles[1], 'p99_ms': percentiles[2],
+            'max_ms': max(times) * 1000 if times else 0.0,
+        }
+    return {
+        'games': len(records),
+        'wall_time': wall_time,
+        'games_per_second': len(records) / wall_time if wall_time else 0.0,
+        'players': table,
+    }
+
+
+def print_summary(summary, out=sys.stdout):
+    print(f"{summary['games']} games in {summary['wall_time']:.1f}s "
+          f"({summary['games_per_second']:.1f} games/s)", file=out)
+    print(f"{'player':<24}{'games':>7}{'win%':>7}{'draw%':>7}{'elo':>7}"
+          f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}", file=out)
+    for name, row in sorted(summary['players'].items(), key=lambda item: -item[1]['elo']):
+        games = row['games'] or 1
+        print(f"{name:<24}{row['games']:>7}{100 * row['won'] / games:>7.1f}"
+              f"{100 * row['drawn'] / games:>7.1f}{row['elo']:>7.0f}{row['p50_ms']:>9.2f}"
+              f"{row['p90_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['max_ms']:>9.2f}", file=out)
+
+
+def run_tournament(game_name, boards, players, games, workers=None, out=None, seed=0,
+                   self_play=False):
+    """Play the tournament and return its summary. Each finished game's
+    record is written as a JSON line to the file object out, if given."""
+    for name in players:
+        make_player(name)  # fail early on unknown names
+    records = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_match, game_name, tuple(board), names, seed + i)
+                   for i, (board, names) in enumerate(schedule(players, boards, games, self_play))]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            if out is not None:
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+    return summarize(records, players, time.perf_counter() - start)
+
+
+def parse_board(text):
+    return tuple(int(n) for n in text.split(','))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--game', choices=sorted(GAMES), default='nim')
+    parser.add_argument('--boards', nargs='+', type=parse_board,
+                        help='comma-separated piles for nim, h,v,k for the others')
+    parser.add_argument('--players', nargs='+', default=['alpha_beta', 'random'],
+                        help=f"names from {sorted(PLAYERS)} or module:attribute")
+    parser.add_argument('--games', type=int, default=100,
+                        help='games per pair of players on each board')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--self-play', action='store_true',
+                        help='also play each player against itself')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write one JSON line per game to this file')
+    parser.add_argument('--summary', help='write the summary as JSON to this file')
+    args = parser.parse_args(argv)
+
+    boards = args.boards or GAMES[args.game][1]
+    out = open(args.out, 'w') if args.out else None
+    try:
+        summary = run_tournament(args.game, boards, args.players, args.games, args.workers,
+                                 out, args.seed, args.self_play)
+    finally:
+        if out is not None:
+            out.close()
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()